@@ -0,0 +1,72 @@
+"""
+Micro-benchmark for the lacing decoders in matroska.blocks.
+
+Compares the offset-based readers with the previous slicing decoders on a laced block for each of the three lacing
+modes (Xiph, EBML and fixed-size).
+
+Usage: python benchmarks/lacing.py [frames] [framesize]
+"""
+
+import sys
+import timeit
+from ebml.util import parseVint, fromVint
+from matroska.blocks import SimpleBlock
+
+def legacyDecodeFixedSizeLacing(data):
+    n = data[0] + 1
+    size, r = divmod(len(data) - 1, n)
+    return ((size,)*(n - 1), data[1:])
+
+def legacyDecodeXiphLacing(data):
+    n = data[0] + 1
+    data = data[1:]
+    sizes = []
+
+    for k in range(n - 1):
+        j = 0
+
+        while data[0] == 255:
+            data = data[1:]
+            j += 1
+
+        sizes.append(255*j + data[0])
+        data = data[1:]
+
+    return sizes, data
+
+def legacyDecodeEBMLLacing(data):
+    n = data[0] + 1
+    data = data[1:]
+
+    size, data = parseVint(data)
+    sizes = [fromVint(size)]
+
+    for k in range(n - 2):
+        size, data = parseVint(data)
+        sizes.append(sizes[-1] + fromVint(size) - 2**(7*len(size) - 1) + 1)
+
+    return sizes, data
+
+def main(frames=256, framesize=1500):
+    sizes = [framesize + (k % 7) for k in range(frames)]
+    payload = b"".join(bytes(size) for size in sizes)
+
+    blocks = {
+            "xiph": (SimpleBlock.encodeXiphLacing(sizes[:-1]) + payload,
+                     legacyDecodeXiphLacing, SimpleBlock.readXiphLacing),
+            "ebml": (SimpleBlock.encodeEBMLLacing(sizes[:-1]) + payload,
+                     legacyDecodeEBMLLacing, SimpleBlock.readEBMLLacing),
+            "fixed": ((frames - 1).to_bytes(1, "big") + bytes(framesize*frames),
+                      legacyDecodeFixedSizeLacing, SimpleBlock.readFixedSizeLacing),
+        }
+
+    print(f"{frames} frames of ~{framesize} bytes per block")
+
+    for name, (data, legacy, current) in blocks.items():
+        number = 20
+        old = timeit.timeit(lambda: legacy(data), number=number)/number
+        new = timeit.timeit(lambda: current(data), number=number)/number
+        print(f"{name:>6}: legacy {1000*old:9.3f} ms   offset-based {1000*new:9.3f} ms   speedup {old/new:8.1f}x")
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
@@ -5,3 +5,6 @@ from .blocks import Packet, SimpleBlock, Block, BlockGroup
 from .chapters import Chapters, EditionEntry, ChapterAtom
 from .tags import Tag, Tags, SimpleTag, Targets
 from .file import MatroskaFile
+from .stream import MatroskaStreamWriter, MatroskaStreamParser
+from .remux import concat
+from .probe import probe
@@ -4,10 +4,86 @@ import io
 import mimetypes
 import os
 import random
+from contextlib import nullcontext
 from itertools import count
 
+def _copyRange(src, offset, size, dst, lock=None):
+    """
+    Copies 'size' bytes at 'offset' in file object 'src' to the current position of file object 'dst'.
+
+    Data is copied between file descriptors with os.copy_file_range or os.sendfile where possible (without moving
+    the position of 'src', so 'lock' is not needed), and through a reused buffer with readinto otherwise, holding
+    'lock' (if specified) while seeking and reading 'src'.
+    """
+
+    try:
+        srcfd = src.fileno()
+        dstfd = dst.fileno()
+        dst.flush()
+        start = dst.tell()
+
+    except (AttributeError, io.UnsupportedOperation, OSError):
+        srcfd = None
+
+    if srcfd is not None:
+        copied = 0
+
+        with lock or nullcontext():
+            if src.writable():
+                src.flush()
+
+        if hasattr(os, "copy_file_range"):
+            try:
+                while copied < size:
+                    n = os.copy_file_range(srcfd, dstfd, size - copied, offset + copied, start + copied)
+
+                    if n == 0:
+                        break
+
+                    copied += n
+
+            except OSError:
+                """Not supported between these files (e.g., across file systems on older kernels)."""
+                pass
+
+        if copied < size and hasattr(os, "sendfile"):
+            try:
+                os.lseek(dstfd, start + copied, os.SEEK_SET)
+
+                while copied < size:
+                    n = os.sendfile(dstfd, srcfd, offset + copied, size - copied)
+
+                    if n == 0:
+                        break
+
+                    copied += n
+
+            except OSError:
+                pass
+
+        dst.seek(start + copied)
+        offset += copied
+        size -= copied
+
+    if size <= 0:
+        return
+
+    buffer = memoryview(bytearray(min(size, 1024**2)))
+
+    while size > 0:
+        with lock or nullcontext():
+            src.seek(offset)
+            n = src.readinto(buffer[:min(size, len(buffer))])
+
+        if not n:
+            raise EOFError("Unexpected end of file while copying attachment data.")
+
+        dst.write(buffer[:n])
+        offset += n
+        size -= n
+
 class FilePointer(object):
-    def __init__(self, file, lock, offset, size):
+    def __init__(self, file, lock, offset, size, map=None):
         if not isinstance(file, (io.BufferedReader, io.BufferedRandom)):
             raise TypeError("File is not of type io.BufferedReader or io.BufferedRandom.")
 
@@ -18,11 +94,16 @@ class FilePointer(object):
         self.lock = lock
         self.offset = offset
         self.size = size
+        self.map = map
 
     def __iter__(self):
         offset = self.offset
         endoffset = offset + self.size
 
+        if self.map is not None:
+            yield self.map[offset:endoffset]
+            return
+
         while offset < endoffset:
             with self.lock:
                 self.file.seek(offset)
@@ -31,6 +112,16 @@ class FilePointer(object):
 
             yield data
 
+    def copyTo(self, file):
+        """
+        Writes the data pointed to into 'file', directly between file descriptors where possible.
+        """
+        if self.map is not None:
+            file.write(self.map[self.offset:self.offset + self.size])
+
+        else:
+            _copyRange(self.file, self.offset, self.size, file, self.lock)
+
 class FileName(EBMLString):
     ebmlID = b"\x46\x6e"
 
@@ -91,13 +182,25 @@ class FileData(EBMLData):
         return b"".join(self)
 
     def _toFile(self, file):
-        for chunk in self:
-            file.write(chunk)
+        if isinstance(self.data, FilePointer):
+            self.data.copyTo(file)
+
+        elif isinstance(self.data, io.BufferedReader):
+            offset = self.data.tell()
+            size = self.data.seek(0, 2) - offset
+            _copyRange(self.data, offset, size, file)
+            self.data.seek(offset + size)
+
+        else:
+            for chunk in self:
+                file.write(chunk)
 
     @classmethod
     def _fromFile(cls, file, size, parent=None):
         if parent is not None:
-            self = cls(data=FilePointer(file, parent.body.lock, file.tell(), size), parent=parent)
+            body = parent.body
+            self = cls(data=FilePointer(file, body.lock, file.tell(), size, map=getattr(body, "_map", None)),
+                       parent=parent)
             file.seek(size, 1)
 
         else:
@@ -141,21 +244,21 @@ class AttachedFile(EBMLMasterElement):
                    fileData=fileData, description=description, parent=None)
 
     def _toFile(self, file):
-        data = b""
+        chunks = []
 
         for child in self.iterchildren():
             if isinstance(child, FileData):
-                if data:
-                    file.write(data)
-                    data = b""
+                if chunks:
+                    file.write(b"".join(chunks))
+                    chunks.clear()
 
                 child.toFile(file)
 
             else:
-                data += child.toBytes()
+                chunks.append(child.toBytes())
 
-        if data:
-            file.write(data)
+        if chunks:
+            file.write(b"".join(chunks))
 
     @classmethod
     def _fromFile(cls, file, size, parent=None):
@@ -185,12 +288,8 @@ class AttachedFile(EBMLMasterElement):
         if os.path.isfile(path) and noclobber:
             raise FileExistsError(f"File already exists: {path}")
 
-        file = open(path, "wb")
-
-        for chunk in self.fileData:
-            file.write(chunk)
-
-        file.close()
+        with open(path, "wb") as file:
+            self.fileData._toFile(file)
 
 class AttachedFiles(EBMLList):
     itemclass = AttachedFile
@@ -1,5 +1,6 @@
 from ebml.base import EBMLMasterElement, EBMLData, EBMLInteger, EBMLElement, EBMLProperty, EBMLList
 from ebml.util import parseVint, toVint, fromVint, formatBytes, parseElements
+from .util import parseVintAt, iterElements
 import traceback
 import sys
 import zlib
@@ -11,7 +12,7 @@ class intlist(EBMLList):
 
 class Packet(object):
     trackNumber = EBMLProperty("trackNumber", int)
-    data = EBMLProperty("data", bytes, optional=True)
+    data = EBMLProperty("data", (bytes, memoryview), optional=True)
     pts = EBMLProperty("pts", int, optional=True)
     duration = EBMLProperty("duration", int, optional=True)
     keyframe = EBMLProperty("keyframe", bool, optional=True)
@@ -191,14 +192,19 @@ class SimpleBlock(EBMLElement):
 
     @property
     def pktduration(self):
-        if self.trackEntry is not None and isinstance(self.trackEntry.defaultDuration, int):
-            q, r = divmod(self.trackEntry.defaultDuration, 1000)
+        trackEntry = self.trackEntry
+
+        if trackEntry is not None:
+            defaultDuration = trackEntry.defaultDuration
+
+            if isinstance(defaultDuration, int):
+                q, r = divmod(defaultDuration, 1000)
 
-            if r % 111 in (0, 1):
-                """Possible repeating digit. Will assume as such."""
-                return 1000*q + r + QQ(r//111, 9)
+                if r % 111 in (0, 1):
+                    """Possible repeating digit. Will assume as such."""
+                    return 1000*q + r + QQ(r//111, 9)
 
-            return self.trackEntry.defaultDuration
+                return defaultDuration
 
     @property
     def duration(self):
@@ -304,57 +310,113 @@ class SimpleBlock(EBMLElement):
         return f"{self.__class__.__name__}({params})"
 
     @staticmethod
-    def decodeFixedSizeLacing(data):
-        n = data[0] + 1
-        size, r = divmod(len(data) - 1, n)
+    def readFixedSizeLacing(data, offset=0, end=None):
+        """
+        Reads fixed-size lacing header starting at data[offset]. 'end' defaults to len(data).
+
+        Returns a tuple (sizes, lacedDataOffset), where 'sizes' excludes the last frame.
+        """
+        if end is None:
+            end = len(data)
+
+        n = data[offset] + 1
+        size, r = divmod(end - offset - 1, n)
 
         if r:
             raise ValueError("Data size not evenly divisble by number of blocks!")
 
-        return [data[j:j+size] for j in range(1, len(data), size)]
+        return ((size,)*(n - 1), offset + 1)
 
     @staticmethod
-    def decodeFixedSizeLacing(data):
-        n = data[0] + 1
-        size, r = divmod(len(data) - 1, n)
+    def readXiphLacing(data, offset=0):
+        """
+        Reads Xiph lacing header starting at data[offset].
 
-        if r:
-            raise ValueError("Data size not evenly divisble by number of blocks!")
+        Returns a tuple (sizes, lacedDataOffset), where 'sizes' excludes the last frame.
+        """
+        n = data[offset]
+        offset += 1
+
+        sizes = []
+
+        for k in range(n):
+            size = 0
+
+            while data[offset] == 255:
+                size += 255
+                offset += 1
+
+            sizes.append(size + data[offset])
+            offset += 1
 
-        return ((size,)*(n - 1), data[1:])
+        return (sizes, offset)
 
     @staticmethod
-    def decodeXiphLacing(data):
-        n = data[0] + 1
-        data = data[1:]
+    def readEBMLLacing(data, offset=0):
+        """
+        Reads EBML lacing header starting at data[offset].
 
-        sizes = []
+        Returns a tuple (sizes, lacedDataOffset), where 'sizes' excludes the last frame.
+        """
+        n = data[offset]
+        offset += 1
+
+        size, length = parseVintAt(data, offset)
+        offset += length
+        sizes = [size]
 
         for k in range(n - 1):
-            j = 0
+            delta, length = parseVintAt(data, offset)
+            offset += length
+            size += delta - 2**(7*length - 1) + 1
+            sizes.append(size)
 
-            while data[0] == 255:
-                data = data[1:]
-                j += 1
+        return (sizes, offset)
 
-            sizes.append(255*j + data[0])
-            data = data[1:]
+    @classmethod
+    def readLacing(cls, lacing, data, offset=0, end=None):
+        """
+        Reads lacing header for the lacing mode 'lacing' (0b00, 0b01, 0b10 or 0b11) starting at data[offset].
+
+        Returns a tuple (sizes, lacedDataOffset), where 'sizes' excludes the last frame.
+        """
+        if lacing == 0b10:
+            return cls.readFixedSizeLacing(data, offset, end)
 
-        return sizes, data
+        elif lacing == 0b11:
+            return cls.readEBMLLacing(data, offset)
+
+        elif lacing == 0b01:
+            return cls.readXiphLacing(data, offset)
+
+        return ([], offset)
 
     @staticmethod
-    def decodeEBMLLacing(data):
-        n = data[0] + 1
-        data = data[1:]
+    def decodeFixedSizeLacing(data):
+        sizes, offset = SimpleBlock.readFixedSizeLacing(data)
+        return (sizes, data[offset:])
+
+    @staticmethod
+    def decodeXiphLacing(data):
+        sizes, offset = SimpleBlock.readXiphLacing(data)
+        return (sizes, data[offset:])
 
-        size, data = parseVint(data)
-        sizes = [fromVint(size)]
+    @staticmethod
+    def decodeEBMLLacing(data):
+        sizes, offset = SimpleBlock.readEBMLLacing(data)
+        return (sizes, data[offset:])
 
-        for k in range(n - 2):
-            size, data = parseVint(data)
-            sizes.append(sizes[-1] + fromVint(size) - 2**(7*len(size) - 1) + 1)
+    @staticmethod
+    def parseHeader(data, offset=0):
+        """
+        Parse block header starting at data[offset], without copying data.
 
-        return sizes, data
+        Returns a tuple: (trackNumber, localpts, flags, lacedDataOffset)
+        """
+        trackNumber, size = parseVintAt(data, offset)
+        offset += size
+        localpts = int.from_bytes(data[offset:offset + 2], "big", signed=True)
+        return (trackNumber, localpts, data[offset + 2], offset + 3)
 
     @staticmethod
     def parsepkt(data):
@@ -363,19 +425,25 @@ class SimpleBlock(EBMLElement):
 
         Returns a tuple: (trackNumber, localpts, keyframe, invisible, discardable, lacing, numberInLace, lacedData)
         """
-        trackNumber, data = parseVint(data)
-        localpts = int.from_bytes(data[:2], "big", signed=True)
-        flags = data[2]
+        trackNumber, localpts, flags, offset = SimpleBlock.parseHeader(data)
         keyframe = bool(flags & 0b10000000)
         invisible = bool(flags & 0b00001000)
         discardable = (flags & 0b00000001)
         lacing = (flags & 0b00000110) >> 1
-        return (fromVint(trackNumber), localpts, keyframe, invisible, discardable, lacing, data[3:])
+        return (trackNumber, localpts, keyframe, invisible, discardable, lacing, data[offset:])
 
     @classmethod
     def _fromBytes(cls, data, parent=None):
+        """
+        Parses block contents. 'data' may be a memoryview into a larger buffer (e.g., an entire cluster), in which
+        case packet payloads are copied out of it exactly once. If the file was opened with mmap=True, packet
+        payloads are left as memoryviews into the memory map instead.
+        """
         self = cls.__new__(cls)
         self._parent = parent
+        data = memoryview(data)
+        body = self.body
+        zerocopy = body is not None and getattr(body, "_map", None) is not None
 
         (self.trackNumber, self.localpts, self.keyFrame, self.invisible,
          self.discardable, self.lacing, data) = self.parsepkt(data)
@@ -389,40 +457,36 @@ class SimpleBlock(EBMLElement):
 
         self.packets = Packets([], parent=self)
 
-        if self.lacing == 0b10:
-            sizes, data = self.decodeFixedSizeLacing(data)
-
-        elif self.lacing == 0b11:
-            sizes, data = self.decodeEBMLLacing(data)
-
-        elif self.lacing == 0b01:
-            sizes, data = self.decodeXiphLacing(data)
-
-        else:
-            sizes = []
-
+        sizes, offset = self.readLacing(self.lacing, data)
         chunks = []
 
         for size in sizes:
-            chunks.append(data[:size])
-            data = data[size:]
+            chunks.append(data[offset:offset + size])
+            offset += size
+
+        chunks.append(data[offset:])
 
-        chunks.append(data)
+        pktduration = self.pktduration
+        pts0 = self.pts*self.body.info.timestampScale
+        hasDefaultDuration = trackEntry is not None and trackEntry.defaultDuration is not None and pktduration is not None
 
         for k, chunk in enumerate(chunks):
-            if self.trackEntry is not None and self.trackEntry.defaultDuration is not None and self.pktduration is not None:
-                pts = self.pts*self.body.info.timestampScale + k*self.pktduration
+            if hasDefaultDuration:
+                pts = pts0 + k*pktduration
 
             else:
-                pts = self.pts*self.body.info.timestampScale
+                pts = pts0
+
+            if not zerocopy:
+                chunk = chunk.tobytes()
 
             if compression is not None:
                 pkt = Packet(self.trackNumber, zdata=chunk, compression=compression, keyframe=self.keyFrame,
-                             pts=pts, duration=self.pktduration, parent=self)
+                             pts=pts, duration=pktduration, parent=self)
 
             else:
                 pkt = Packet(self.trackNumber, data=chunk, keyframe=self.keyFrame,
-                             pts=pts, duration=self.pktduration, parent=self)
+                             pts=pts, duration=pktduration, parent=self)
 
             pkt.readonly = True
             self.packets.append(pkt)
@@ -543,15 +607,13 @@ class Block(SimpleBlock):
 
         Returns a tuple: (trackNumber, localpts, keyframe, invisible, discardable, lacing, numberInLace, lacedData)
         """
-        trackNumber, data = parseVint(data)
-        localpts = int.from_bytes(data[:2], "big", signed=True)
-        flags = data[2]
+        trackNumber, localpts, flags, offset = Block.parseHeader(data)
         keyframe = False
         invisible = bool(flags & 0b00001000)
         discardable = (flags & 0b00000001)
         lacing = (flags & 0b00000110) >> 1
 
-        return (fromVint(trackNumber), localpts, keyframe, invisible, discardable, lacing, data[3:])
+        return (trackNumber, localpts, keyframe, invisible, discardable, lacing, data[offset:])
 
     #parsepkt = matroska.util.parseBlock
 
@@ -679,18 +741,18 @@ class BlockGroup(EBMLMasterElement):
         referencePriority = None
         duration = None
 
-        for offset, ebmlID, sizesize, data in parseElements(data):
+        for offset, ebmlID, sizesize, start, end in iterElements(data):
             if ebmlID == Block.ebmlID:
-                (trackNumber, localpts, keyframe, invisible, discardable, lacing, pktdata) = Block.parsepkt(data)
+                (trackNumber, localpts, keyframe, invisible, discardable, lacing, pktdata) = Block.parsepkt(data[start:end])
 
             elif ebmlID == ReferencePriority.ebmlID:
-                referencePriority = int.from_bytes(data, "big")
+                referencePriority = int.from_bytes(data[start:end], "big")
 
             elif ebmlID == ReferenceBlock.ebmlID:
-                referenceBlocks.append(int.from_bytes(data, "big", signed=True))
+                referenceBlocks.append(int.from_bytes(data[start:end], "big", signed=True))
 
             elif ebmlID == BlockDuration.ebmlID:
-                duration = int.from_bytes(data, "big")
+                duration = int.from_bytes(data[start:end], "big")
 
         return (trackNumber, localpts, duration, keyframe, invisible, discardable, lacing, pktdata, referencePriority, referenceBlocks)
 
@@ -1,11 +1,13 @@
 from ebml.base import EBMLMasterElement, EBMLInteger, EBMLProperty, EBMLList, CRC32
 from ebml.util import readVint, fromVint, toVint, parseElements
-from matroska.blocks import SimpleBlock, BlockGroup, Blocks, Packet
+from matroska.blocks import SimpleBlock, Block, BlockGroup, Blocks, Packet
+from .util import iterElements
 import threading
 import gc
+from collections import OrderedDict
 from fractions import Fraction as QQ
 
-__all__ = ["Cluster", "Clusters", "ClusterPointer", "Timestamp", "Position", "PrevSize", "SilentTrackNumber", "SilentTrackNumbers", "SilentTracks", "Blocks"]
+__all__ = ["Cluster", "Clusters", "ClusterPointer", "Timestamp", "Position", "PrevSize", "SilentTrackNumber", "SilentTrackNumbers", "SilentTracks", "Blocks", "demuxClusterData", "demuxBlockData", "DemuxedBlock", "ClusterCache"]
 
 class Timestamp(EBMLInteger):
     ebmlID = b"\xe7"
@@ -42,8 +44,14 @@ class Cluster(EBMLMasterElement):
             EBMLProperty("dataSize", int, optional=True),
         )
 
+    _rawData = None
+
     def __init__(self, timestamp, silentTracks=None, position=None, prevSize=None, blocks=None,
-                 offsetInSegment=None, dataSize=None, readonly=False, parent=None):
+                 offsetInSegment=None, dataSize=None, readonly=False, parent=None, rawData=None):
+        """
+        'rawData': Already serialized cluster contents (Timestamp, blocks, ...). If specified, it is written
+            verbatim in place of the child elements (see Segment.writeRawCluster).
+        """
         self.timestamp = timestamp
         self.silentTracks = silentTracks
         self.position = position
@@ -54,9 +62,13 @@ class Cluster(EBMLMasterElement):
         self.parent = parent
         self._lock = threading.Lock()
         self._iterBlockCount = 0
+        self._rawData = rawData
         self.readonly = readonly
 
     def _size(self):
+        if self._rawData is not None:
+            return len(self._rawData)
+
         if self.blocks is None and self.offsetInSegment:
             return self.dataSize
 
@@ -110,18 +122,15 @@ class Cluster(EBMLMasterElement):
         'trackNumber': Filters by trackNumber. Can be either an integer or list/tuple of integers.
         """
 
-        data = self.parent.readbytes(self.offsetInSegment, self.dataSize)
+        data = memoryview(self.parent.readClusterData(self.offsetInSegment, self.dataSize))
         timestampScale = self.segment.info.timestampScale
 
-        for offset, ebmlID, sizesize, data in parseElements(data):
+        for offset, ebmlID, sizesize, start, end in iterElements(data):
             if offset < startPosition:
                 continue
 
-            dataSize = len(data)
-
             if ebmlID == SimpleBlock.ebmlID:
-                (trackNumber_, localpts, keyframe, invisible, discardable, lacing, data_) = SimpleBlock.parsepkt(data)
-                defaultDuration = self.segment.tracks.byTrackNumber[trackNumber_].defaultDuration or 0
+                (trackNumber_, localpts, flags, lacedDataOffset) = SimpleBlock.parseHeader(data, start)
 
                 if (self.timestamp + localpts)*timestampScale < start_pts*10**9:
                     continue
@@ -133,15 +142,21 @@ class Cluster(EBMLMasterElement):
                     continue
 
 
-                block = SimpleBlock.fromBytes(ebmlID + toVint(len(data)) + data, parent=self)
+                block = SimpleBlock._fromBytes(data[start:end], parent=self)
                 block.offsetInParent = offset
                 block.dataOffsetInParent = offset + len(ebmlID) + sizesize
-                block.dataSize = len(data)
+                block.dataSize = end - start
                 yield block
 
             elif ebmlID == BlockGroup.ebmlID:
-                (trackNumber_, localpts, duration, keyframe, invisible, discardable, lacing,
-                        data_, referencePriority, referenceBlocks) = BlockGroup.parsepkt(data)
+                for childOffset, childID, childSizeSize, childStart, childEnd in iterElements(data, start, end):
+                    if childID == Block.ebmlID:
+                        break
+
+                else:
+                    continue
+
+                (trackNumber_, localpts, flags, lacedDataOffset) = Block.parseHeader(data, childStart)
 
                 if (self.timestamp + localpts)*timestampScale < start_pts*10**9:
                     continue
@@ -152,10 +167,10 @@ class Cluster(EBMLMasterElement):
                 elif isinstance(trackNumber, int) and trackNumber_ != trackNumber:
                     continue
 
-                block = BlockGroup.fromBytes(ebmlID + toVint(len(data)) + data, parent=self)
+                block = BlockGroup.fromBytes(data[offset:end].tobytes(), parent=self)
                 block.offsetInParent = offset
                 block.dataOffsetInParent = offset + len(ebmlID) + sizesize
-                block.dataSize = len(data)
+                block.dataSize = end - start
                 yield block
 
     def copy(self):
@@ -169,10 +184,9 @@ class Cluster(EBMLMasterElement):
         self._readonly = False
         self.blocks = None
         self._readonly = rostatus
-        gc.collect()
 
     def _loadBlocks(self):
-        data = self.parent.readbytes(self.offsetInSegment, self.dataSize)
+        data = bytes(self.parent.readClusterData(self.offsetInSegment, self.dataSize))
         rostatus = self.readonly
         self._readonly = False
         self._timestamp = None
@@ -215,8 +229,11 @@ class Cluster(EBMLMasterElement):
             return super(Cluster, cls)._fromFile(file, size, ebmlID, parent)
 
     def _toBytes(self):
+        if self._rawData is not None:
+            return bytes(self._rawData)
+
         if self.blocks is None and self.parent is not None:
-            return self.parent.readbytes(self.dataOffsetInParent, self.dataSize)
+            return bytes(self.parent.readbytes(self.dataOffsetInParent, self.dataSize))
 
         else:
             return super(Cluster, self)._toBytes()
@@ -228,11 +245,27 @@ class Cluster(EBMLMasterElement):
         super(Cluster, self).toFile(file)
 
     def _toFile(self, file):
-        if self.parent is not None:
+        if self._rawData is not None:
+            if self.parent is not None:
+                self.dataOffsetInParent = self.parent.tell()
+
+            self.dataSize = len(self._rawData)
+            file.write(self._rawData)
+
+            if self.parent is not None:
+                """Contents can be read back from the file. Releases the serialized data, as _forgetBlocks() does."""
+                self.offsetInSegment = self.dataOffsetInParent
+                self._rawData = None
+
+        elif self.parent is not None:
             self.dataOffsetInParent = self.parent.tell()
             self.dataSize = self._size()
 
-            super(Cluster, self)._toFile(file)
+            if getattr(self.parent, "bufferClusters", False):
+                file.write(super(Cluster, self)._toBytes())
+
+            else:
+                super(Cluster, self)._toFile(file)
 
             with self._lock:
                 if self._iterBlockCount == 0:
@@ -246,112 +279,59 @@ class Cluster(EBMLMasterElement):
 
     def scanBlocks(self):
         """Quick scan cluster for packets."""
-        data = self.parent.readbytes(self.offsetInSegment, self.dataSize)
+        data = memoryview(self.parent.readClusterData(self.offsetInSegment, self.dataSize))
         timestampScale = self.segment.info.timestampScale
+        byTrackNumber = self.segment.tracks.byTrackNumber
 
-        for offset, ebmlID, sizesize, data in parseElements(data):
-            dataSize = len(data)
+        for offset, ebmlID, sizesize, start, end in iterElements(data):
+            dataSize = end - start
 
             if ebmlID == SimpleBlock.ebmlID:
-                (trackNumber, localpts, keyframe, invisible, discardable, lacing, data) = SimpleBlock.parsepkt(data)
-                defaultDuration = self.segment.tracks.byTrackNumber[trackNumber].defaultDuration or 0
-
-                if lacing == 0b10:
-                    sizes, data = SimpleBlock.decodeFixedSizeLacing(data)
-
-                elif lacing == 0b11:
-                    sizes, data = SimpleBlock.decodeEBMLLacing(data)
-
-                elif lacing == 0b01:
-                    sizes, data = SimpleBlock.decodeXiphLacing(data)
-
-                else:
-                    sizes = []
+                (trackNumber, localpts, keyframe, invisible, discardable, lacing, pktdata) = SimpleBlock.parsepkt(data[start:end])
+                sizes, lacedDataOffset = SimpleBlock.readLacing(lacing, pktdata)
+                duration = _blockDuration(len(sizes) + 1, None, byTrackNumber[trackNumber].defaultDuration)
 
                 yield (offset, ebmlID, sizesize, dataSize, len(sizes) + 1, trackNumber, timestampScale*(self.timestamp + localpts),
-                       defaultDuration, keyframe, invisible, discardable, None, None)
+                       duration, keyframe, invisible, discardable, None, None)
 
             elif ebmlID == BlockGroup.ebmlID:
                 (trackNumber, localpts, duration, keyframe, invisible, discardable, lacing,
-                        data, referencePriority, referenceBlocks) = BlockGroup.parsepkt(data)
+                        pktdata, referencePriority, referenceBlocks) = BlockGroup.parsepkt(data[start:end])
 
                 keyframe = not referenceBlocks and not discardable
-                defaultDuration = self.segment.tracks.byTrackNumber[trackNumber].defaultDuration or 0
-
-                q, r = divmod(defaultDuration, 1000)
-
-                if r % 111 in (0, 1):
-                    """Possible repeating digit. Will assume as such."""
-                    defaultDuration = 1000*q + r + QQ(r//111, 9)
-
-                if lacing == 0b10:
-                    sizes, data = matroska.blocks.Block.decodeFixedSizeLacing(data)
-
-                elif lacing == 0b11:
-                    sizes, data = matroska.blocks.Block.decodeEBMLLacing(data)
-
-                elif lacing == 0b01:
-                    sizes, data = matroska.blocks.Block.decodeXiphLacing(data)
-
-                else:
-                    sizes = []
-
-                if duration is None:
-                    duration = defaultDuration
-
-                else:
-                    duration *= timestampScale
+                sizes, lacedDataOffset = Block.readLacing(lacing, pktdata)
+                duration = _blockDuration(len(sizes) + 1, duration*timestampScale if duration is not None else None,
+                                          byTrackNumber[trackNumber].defaultDuration)
 
                 yield (offset, ebmlID, sizesize, dataSize, len(sizes) + 1, trackNumber, timestampScale*(self.timestamp + localpts),
                        duration, keyframe, invisible, discardable, referencePriority, referenceBlocks)
 
     def scan(self):
         """Quick scan cluster for packets."""
-        data = self.parent.readbytes(self.offsetInSegment, self.dataSize)
+        data = memoryview(self.parent.readClusterData(self.offsetInSegment, self.dataSize))
         timestampScale = self.segment.info.timestampScale
+        byTrackNumber = self.segment.tracks.byTrackNumber
 
-        for offset, ebmlID, sizesize, data in parseElements(data):
+        for offset, ebmlID, sizesize, start, end in iterElements(data):
             if ebmlID == SimpleBlock.ebmlID:
-                (trackNumber, localpts, keyframe, invisible, discardable, lacing, data) = SimpleBlock.parsepkt(data)
-                defaultDuration = self.segment.tracks.byTrackNumber[trackNumber].defaultDuration or 0
-
-                if lacing == 0b10:
-                    sizes, data = SimpleBlock.decodeFixedSizeLacing(data)
-
-                elif lacing == 0b11:
-                    sizes, data = SimpleBlock.decodeEBMLLacing(data)
-
-                elif lacing == 0b01:
-                    sizes, data = SimpleBlock.decodeXiphLacing(data)
-
-                else:
-                    sizes = []
+                (trackNumber, localpts, keyframe, invisible, discardable, lacing, pktdata) = SimpleBlock.parsepkt(data[start:end])
+                defaultDuration = byTrackNumber[trackNumber].defaultDuration or 0
+                sizes, lacedDataOffset = SimpleBlock.readLacing(lacing, pktdata)
 
                 for k, size in enumerate(sizes):
                     yield (offset, size, trackNumber, timestampScale*(self.timestamp + localpts) + k*defaultDuration,
                            defaultDuration, keyframe, invisible, discardable, None, None)
 
-                yield (offset, len(data) - sum(sizes), trackNumber, timestampScale*(self.timestamp + localpts) + len(sizes)*defaultDuration,
+                yield (offset, len(pktdata) - lacedDataOffset - sum(sizes), trackNumber, timestampScale*(self.timestamp + localpts) + len(sizes)*defaultDuration,
                        defaultDuration, keyframe, invisible, discardable, None, None)
 
             elif ebmlID == BlockGroup.ebmlID:
                 (trackNumber, localpts, duration, keyframe, invisible, discardable, lacing,
-                        data, referencePriority, referenceBlocks) = BlockGroup.parsepkt(data)
+                        pktdata, referencePriority, referenceBlocks) = BlockGroup.parsepkt(data[start:end])
 
                 keyframe = not referenceBlocks and not discardable
-                defaultDuration = self.segment.tracks.byTrackNumber[trackNumber].defaultDuration or 0
-
-                if lacing == 0b10:
-                    sizes, data = matroska.blocks.Block.decodeFixedSizeLacing(data)
-
-                elif lacing == 0b11:
-                    sizes, data = matroska.blocks.Block.decodeEBMLLacing(data)
-
-                elif lacing == 0b01:
-                    sizes, data = matroska.blocks.Block.decodeXiphLacing(data)
-
-                else:
-                    sizes = []
+                defaultDuration = byTrackNumber[trackNumber].defaultDuration or 0
+                sizes, lacedDataOffset = Block.readLacing(lacing, pktdata)
 
                 if duration is None:
                     duration = defaultDuration
@@ -363,8 +343,197 @@ class Cluster(EBMLMasterElement):
                     yield (offset, size, trackNumber, timestampScale*(self.timestamp + localpts) + k*defaultDuration,
                            duration, keyframe, invisible, discardable, referencePriority, referenceBlocks)
 
-                yield (offset, len(data) - sum(sizes), trackNumber, timestampScale*(self.timestamp + localpts) + len(sizes)*defaultDuration,
+                yield (offset, len(pktdata) - lacedDataOffset - sum(sizes), trackNumber, timestampScale*(self.timestamp + localpts) + len(sizes)*defaultDuration,
                        duration, keyframe, invisible, discardable, referencePriority, referenceBlocks)
 
 class Clusters(EBMLList):
     itemclass = Cluster
+
+class ClusterCache(object):
+    """
+    Bounded LRU cache of raw cluster contents, keyed by offsetInSegment. See Segment.readClusterData.
+
+    'maxBytes': Maximum total size of cached clusters.
+    'maxEntries': Maximum number of cached clusters.
+    """
+
+    def __init__(self, maxBytes=64*1024**2, maxEntries=64):
+        self.maxBytes = maxBytes
+        self.maxEntries = maxEntries
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def bytes(self):
+        return self._bytes
+
+    @property
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses, entries=len(self._items), bytes=self._bytes,
+                    maxBytes=self.maxBytes, maxEntries=self.maxEntries)
+
+    def get(self, offset, size, read):
+        """
+        Returns cached contents of cluster at 'offset', calling read(offset, size) on a miss.
+        """
+        with self._lock:
+            data = self._items.get(offset)
+
+            if data is not None and len(data) == size:
+                self._items.move_to_end(offset)
+                self.hits += 1
+                return data
+
+            self.misses += 1
+
+        data = read(offset, size)
+
+        if len(data) > self.maxBytes:
+            return data
+
+        with self._lock:
+            old = self._items.pop(offset, None)
+
+            if old is not None:
+                self._bytes -= len(old)
+
+            self._items[offset] = data
+            self._bytes += len(data)
+
+            while self._bytes > self.maxBytes or len(self._items) > self.maxEntries:
+                key, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+def _pktduration(defaultDuration):
+    """Same as SimpleBlock.pktduration, from a track's DefaultDuration."""
+    if isinstance(defaultDuration, int):
+        q, r = divmod(defaultDuration, 1000)
+
+        if r % 111 in (0, 1):
+            """Possible repeating digit. Will assume as such."""
+            return 1000*q + r + QQ(r//111, 9)
+
+        return defaultDuration
+
+class DemuxedBlock(object):
+    """
+    Stands in for the Block that packets built from demuxClusterData output were read from, so that their
+    'trackEntry', 'cluster' and 'segment' properties work as they do for packets from Cluster.iterPackets.
+    """
+
+    def __init__(self, cluster, trackEntry):
+        self.cluster = cluster
+        self.trackEntry = trackEntry
+
+def _blockDuration(frames, blockDuration, defaultDuration):
+    """
+    Duration of a block holding 'frames' laced frames: 'blockDuration' (its BlockDuration, in nanoseconds) if it has
+    one, else 'frames' times the track's 'defaultDuration' (see _pktduration).
+    """
+    if blockDuration is not None:
+        return blockDuration
+
+    return frames*(_pktduration(defaultDuration) or 0)
+
+def demuxClusterData(data, timestamp, timestampScale, tracks, start_pts=0, startPosition=0, trackNumber=None):
+    """
+    Parses the contents of a cluster into packets without constructing any Cluster, Block or Packet objects, yielding
+    the same packets as Cluster.iterPackets. Meant to run in a worker process (see Segment.iterPackets).
+
+    'data': Cluster contents (as read by Segment.readbytes).
+    'timestamp': Cluster timestamp.
+    'tracks': dict mapping track numbers to tuples (defaultDuration, compression).
+
+    Returns a list of tuples: (trackNumber, data, compression, pts, duration, keyframe, invisible, discardable,
+        referenceBlocks). If 'compression' is not None, 'data' is still compressed.
+    """
+
+    data = memoryview(data)
+    packets = [(0, b"", None, timestamp*timestampScale, None, None, False, False, None)]
+
+    for offset, ebmlID, sizesize, start, end in iterElements(data):
+        if offset < startPosition:
+            continue
+
+        if ebmlID in (SimpleBlock.ebmlID, BlockGroup.ebmlID):
+            demuxBlockData(ebmlID, data[start:end], timestamp, timestampScale, tracks, packets,
+                           start_pts=start_pts, trackNumber=trackNumber)
+
+    return packets
+
+def demuxBlockData(ebmlID, data, timestamp, timestampScale, tracks, packets, start_pts=0, trackNumber=None):
+    """
+    Parses the contents of a single SimpleBlock or BlockGroup, appending its packets to 'packets' in the same
+    format as demuxClusterData.
+
+    'ebmlID': SimpleBlock.ebmlID or BlockGroup.ebmlID.
+    'timestamp': Timestamp of the enclosing cluster.
+    """
+
+    if ebmlID == SimpleBlock.ebmlID:
+        (trackNumber_, localpts, keyframe, invisible, discardable, lacing, pktdata) = SimpleBlock.parsepkt(data)
+        blockDuration = referenceBlocks = None
+
+    else:
+        (trackNumber_, localpts, blockDuration, keyframe, invisible, discardable, lacing,
+                pktdata, referencePriority, referenceBlocks) = BlockGroup.parsepkt(data)
+
+    if (timestamp + localpts)*timestampScale < start_pts*10**9:
+        return
+
+    if isinstance(trackNumber, (tuple, list, set)) and trackNumber_ not in trackNumber:
+        return
+
+    elif isinstance(trackNumber, int) and trackNumber_ != trackNumber:
+        return
+
+    defaultDuration, compression = tracks[trackNumber_]
+    pts0 = (timestamp + localpts)*timestampScale
+    sizes, lacedDataOffset = SimpleBlock.readLacing(lacing, pktdata)
+    sizes = list(sizes) + [len(pktdata) - lacedDataOffset - sum(sizes)]
+
+    if ebmlID == SimpleBlock.ebmlID:
+        duration = _pktduration(defaultDuration)
+        step = duration if defaultDuration is not None and duration is not None else 0
+        ptsList = [pts0 + k*step for k in range(len(sizes))]
+
+    else:
+        """Same as Block.ancestorChanged and BlockGroup.iterPackets: laced frames are spread evenly over
+        BlockDuration, and each one is given the full BlockDuration."""
+        duration = blockDuration*timestampScale if blockDuration is not None else None
+
+        if duration is not None:
+            ptsList = [pts0 + k*duration/len(sizes) for k in range(len(sizes))]
+
+        else:
+            ptsList = [pts0]*len(sizes)
+
+        if not referenceBlocks:
+            keyframe = True
+            referenceBlocks = None
+
+        elif duration is not None:
+            referenceBlocks = [dt*timestampScale for dt in referenceBlocks]
+
+        else:
+            referenceBlocks = None
+
+    chunkOffset = lacedDataOffset
+
+    for pts, size in zip(ptsList, sizes):
+        packets.append((trackNumber_, pktdata[chunkOffset:chunkOffset + size].tobytes(), compression,
+                        pts, duration, keyframe, invisible, discardable, referenceBlocks))
+        chunkOffset += size
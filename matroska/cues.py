@@ -1,4 +1,6 @@
 from ebml.base import EBMLMasterElement, EBMLInteger, EBMLList, EBMLProperty, EBMLData
+from array import array
+from bisect import bisect_right
 
 class CueRefTime(EBMLInteger):
     ebmlID = b"\x96"
@@ -68,3 +70,100 @@ class CuePoints(EBMLList):
 class Cues(EBMLMasterElement):
     ebmlID = b"\x1c\x53\xbb\x6b"
     __ebmlchildren__ = (EBMLProperty("cuePoints", CuePoints),)
+
+    _rawData = None
+
+    @classmethod
+    def fromRawData(cls, data):
+        """
+        Creates a Cues element whose contents are the already serialized CuePoint elements in 'data', and are
+        written verbatim.
+        """
+        self = cls([])
+        self._rawData = data
+        return self
+
+    def _size(self):
+        if self._rawData is not None:
+            return len(self._rawData)
+
+        return super(Cues, self)._size()
+
+    def _toBytes(self):
+        if self._rawData is not None:
+            return bytes(self._rawData)
+
+        return super(Cues, self)._toBytes()
+
+    def _toFile(self, file):
+        if self._rawData is not None:
+            file.write(self._rawData)
+
+        else:
+            super(Cues, self)._toFile(file)
+
+
+class CueIndex(object):
+    """
+    Per-track sorted index of cue points, built once from a Cues element for binary search lookups.
+
+    Track None indexes every cue point by its first CueTrackPositions.
+    """
+
+    def __init__(self, cues):
+        self.cues = cues
+        self.length = len(cues.cuePoints)
+
+        entries = {}
+
+        for k, cuePoint in enumerate(cues.cuePoints):
+            seen = set()
+
+            for j, cueTrackPositions in enumerate(cuePoint.cueTrackPositionsList):
+                if j == 0:
+                    entries.setdefault(None, []).append((cuePoint.cueTime, cueTrackPositions.cueClusterPosition, k))
+
+                if cueTrackPositions.cueTrack not in seen:
+                    seen.add(cueTrackPositions.cueTrack)
+                    entries.setdefault(cueTrackPositions.cueTrack, []).append(
+                        (cuePoint.cueTime, cueTrackPositions.cueClusterPosition, k))
+
+        self._times = {}
+        self._positions = {}
+        self._indices = {}
+
+        for trackNumber, items in entries.items():
+            items.sort(key=lambda item: item[0])
+            self._times[trackNumber] = array("q", [item[0] for item in items])
+            self._positions[trackNumber] = array("q", [item[1] for item in items])
+            self._indices[trackNumber] = array("q", [item[2] for item in items])
+
+    def find(self, cueTime, trackNumber=None):
+        """
+        Finds the last cue point for 'trackNumber' with CueTime ≤ 'cueTime'.
+
+        'trackNumber' can be None (any track), an integer, or a list/tuple/set of integers, in which case the cue point
+        with the lowest cluster position among the requested tracks is used.
+
+        Returns a tuple (index into cues.cuePoints, cueClusterPosition), or None if no such cue point exists.
+        """
+
+        if isinstance(trackNumber, (tuple, list, set)):
+            found = [self.find(cueTime, n) for n in trackNumber]
+
+            if not found or None in found:
+                return
+
+            return min(found, key=lambda item: item[1])
+
+        times = self._times.get(trackNumber)
+
+        if not times:
+            return
+
+        j = bisect_right(times, cueTime) - 1
+
+        if j < 0:
+            return
+
+        return (self._indices[trackNumber][j], self._positions[trackNumber][j])
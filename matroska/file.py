@@ -5,8 +5,52 @@ import random
 from .segment import Segment
 
 class MatroskaFile(EBMLDocument):
-    def __init__(self, file, mode="r"):
-        super(MatroskaFile, self).__init__(file, mode, bodycls=Segment)
+    def __init__(self, file, mode="r", lazy=False, mmap=False, clusterCache=None, fastmux=False, interleave=False):
+        """
+        Opens a Matroska file.
+
+        'mode': "r" (read), "w" (write), "a" (append) or "r+" (edit). In append mode, an existing file is opened
+            for reading and writing, and packets passed to mux() are added after its last cluster, with their pts
+            offset by the file's duration. Cues and Tags are rewritten by close(). In edit mode, changes to Info
+            (e.g., title), Tracks, Chapters, Attachments and Tags are written back by close(), in place where they
+            fit, without touching clusters (see Segment.rewriteChildElement).
+
+        'lazy': In read mode, only the SeekHead and the elements it references (Info, Tracks, Cues, ...) are read
+            when the file is opened. Clusters are discovered as they are reached by demuxing or seeking, instead of
+            scanning the whole file up front.
+        'mmap': In read mode, maps the file into memory once. Cluster data, attachment data and packet payloads are
+            then memoryviews into the map instead of freshly read bytes. Raises ValueError in any other mode, as the
+            map would not reflect writes to the file.
+        'clusterCache': A matroska.cluster.ClusterCache holding recently read clusters, for workloads that revisit
+            the same clusters (e.g., seeking back and forth).
+        'fastmux': In write mode, favors throughput: Info is only rewritten at close() instead of with every
+            cluster, each cluster is written with a single write() call, and clusters are not flushed or followed by
+            a garbage collection. See also Segment.infoInterval, Segment.bufferClusters and Segment.syncClusters.
+        'interleave': In write mode, packets passed to mux() are reordered by pts across tracks before being
+            written. See Segment.interleave.
+        """
+        if mmap and mode != "r":
+            raise ValueError("mmap=True is only supported in read mode.")
+
+        self._lazy = lazy
+        self._mmap = mmap
+        self._clusterCache = clusterCache
+        self._fastmux = fastmux
+        self._interleave = interleave
+
+        if mode == "a":
+            super(MatroskaFile, self).__init__(file, "r+", bodycls=Segment)
+            self.body._init_append()
+            self._applyMuxOptions()
+
+        elif mode == "r+":
+            """Only metadata is edited, so clusters are not scanned."""
+            self._lazy = True
+            super(MatroskaFile, self).__init__(file, mode, bodycls=Segment)
+            self.body._init_edit()
+
+        else:
+            super(MatroskaFile, self).__init__(file, mode, bodycls=Segment)
 
     def _init_read(self):
         head = EBMLHead.fromFile(self._file)
@@ -15,7 +59,7 @@ class MatroskaFile(EBMLDocument):
             raise ReadError("Not a matroska file.")
 
         self.head = head
-        self.body = self._bodycls(self._file)
+        self.body = self._bodycls(self._file, lazy=self._lazy, mmap=self._mmap, clusterCache=self._clusterCache)
 
     def _init_write(self):
         head = EBMLHead(docType="matroska", docTypeReadVersion=2, docTypeVersion=4,
@@ -23,6 +67,16 @@ class MatroskaFile(EBMLDocument):
 
         self.writeEBMLHead(head)
         self.beginWriteEBMLBody()
+        self._applyMuxOptions()
+
+    def _applyMuxOptions(self):
+        if self._fastmux:
+            self.body.infoInterval = None
+            self.body.syncClusters = False
+            self.body.bufferClusters = True
+
+        if self._interleave:
+            self.body.interleave = True
 
     @property
     def writingApp(self):
@@ -78,3 +132,22 @@ class MatroskaFile(EBMLDocument):
     def chapters(self):
         return self.segment.chapters
 
+    def extract(self, start, end, out, tracks=None):
+        """
+        Copies the time window from 'start' to 'end' (in seconds) into 'out' (a file name or MatroskaFile opened
+        in write mode), starting at the last keyframe at or before 'start'. Clusters are copied without demuxing.
+
+        See help(matroska.remux.extract).
+        """
+        from .remux import extract
+        extract(self, out, start, end, tracks)
+
+    def split(self, out, maxSize=None, maxDuration=None, tracks=None):
+        """
+        Splits into linked parts of bounded size (in bytes) and/or duration (in seconds), without demuxing. 'out'
+        is a file name pattern formatted with the part number, e.g., "part{:03d}.mkv". Returns list of file names.
+
+        See help(matroska.remux.split).
+        """
+        from .remux import split
+        return split(self, out, maxSize, maxDuration, tracks)
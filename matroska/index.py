@@ -0,0 +1,246 @@
+"""
+Batch indexing of Matroska files, with a persistent cache.
+
+Each file is opened and scanned once in a worker process, and its track metadata, cluster table and keyframe index
+(from Cues) are stored in an SQLite database, keyed by path, size and modification time. Files that have not
+changed since they were last indexed are returned from the database without being opened.
+
+Usage: python -m matroska.index [-d DATABASE] [-j WORKERS] [--json] PATH [PATH ...]
+"""
+
+from .probe import _trackSummary
+
+import os
+import sys
+import json
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+__all__ = ["LibraryIndex", "indexFile"]
+
+extensions = (".mkv", ".mka", ".mks", ".mk3d", ".webm")
+
+def indexFile(path):
+    """
+    Opens and scans a single file. Returns a dict with the Info fields, track metadata (as in matroska.probe()),
+    cluster table (list of [offset, timestamp, size], offsets relative to the start of the segment contents) and
+    keyframe index (list of [cueTime, trackNumber, clusterPosition, relativePosition]).
+
+    Runs in worker processes, so only returns JSON-serializable values.
+    """
+
+    from .file import MatroskaFile
+
+    f = MatroskaFile(path, "r")
+
+    try:
+        segment = f.segment
+        info = segment.info
+
+        clusters = [[cluster.offsetInParent, cluster.timestamp,
+                     cluster.offsetInSegment + cluster.dataSize - cluster.offsetInParent]
+                    for offset, cluster in sorted(segment._clustersByOffset.items())]
+
+        keyframes = []
+
+        if segment.cues is not None:
+            for cuePoint in segment.cues.cuePoints:
+                for cueTrackPositions in cuePoint.cueTrackPositionsList:
+                    keyframes.append([cuePoint.cueTime, cueTrackPositions.cueTrack,
+                                      cueTrackPositions.cueClusterPosition, cueTrackPositions.cueRelativePosition])
+
+        return {
+                "title": info.title,
+                "timestampScale": info.timestampScale,
+                "duration": info.duration*info.timestampScale/10**9 if info.duration is not None else None,
+                "tracks": [_trackSummary(track) for track in segment.tracks.trackEntries],
+                "clusters": clusters,
+                "keyframes": keyframes,
+            }
+
+    finally:
+        f.close()
+
+def _iterPaths(paths):
+    """Expands directories into the Matroska files they contain."""
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+
+                for filename in sorted(filenames):
+                    if filename.lower().endswith(extensions):
+                        yield os.path.join(dirpath, filename)
+
+        else:
+            yield path
+
+class LibraryIndex(object):
+    # Number of newly indexed files written to the database per transaction.
+    commitInterval = 1000
+
+    def __init__(self, db):
+        """
+        Index cache stored in SQLite database 'db' (a path, or ":memory:"), created if it does not exist.
+        """
+        self._conn = sqlite3.connect(db)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime INTEGER NOT NULL,
+                data TEXT NOT NULL
+            )""")
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @staticmethod
+    def _key(path):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        return (path, st.st_size, st.st_mtime_ns)
+
+    def lookup(self, path):
+        """
+        Returns the cached index of 'path' (see indexFile), or None if it is missing or out of date.
+        """
+        return self._lookup(self._key(path))
+
+    def _lookup(self, key):
+        row = self._conn.execute("SELECT data FROM files WHERE path = ? AND size = ? AND mtime = ?", key).fetchone()
+
+        if row is not None:
+            return json.loads(row[0])
+
+    def index(self, paths, workers=None, executor=None):
+        """
+        Indexes 'paths' (files, or directories searched for Matroska files), returning a dict mapping absolute paths
+        to their index (see indexFile). Files that could not be read map to the exception raised instead.
+
+        'workers': Size of the process pool that out-of-date files are fanned out to (default: CPU count). At most
+            4*workers files are submitted at a time.
+        'executor': A concurrent.futures.Executor to use instead of creating a process pool.
+
+        Results are committed to the database every self.commitInterval files, and when done.
+        """
+        results = {}
+        pending = []
+
+        for path in _iterPaths(paths):
+            try:
+                key = self._key(path)
+
+            except OSError as exc:
+                results[os.path.abspath(path)] = exc
+                continue
+
+            data = self._lookup(key)
+
+            if data is not None:
+                results[key[0]] = data
+
+            else:
+                pending.append(key)
+
+        if not pending:
+            return results
+
+        shutdown = executor is None
+
+        if executor is None:
+            executor = ProcessPoolExecutor(max_workers=workers)
+
+        maxInFlight = 4*(workers or os.cpu_count() or 1)
+        keys = iter(pending)
+        futures = {}
+        uncommitted = 0
+
+        try:
+            while True:
+                for key in keys:
+                    futures[executor.submit(indexFile, key[0])] = key
+
+                    if len(futures) >= maxInFlight:
+                        break
+
+                if not futures:
+                    break
+
+                done, notDone = wait(futures, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    path, size, mtime = futures.pop(future)
+
+                    try:
+                        data = future.result()
+
+                    except Exception as exc:
+                        results[path] = exc
+                        continue
+
+                    self._conn.execute("INSERT OR REPLACE INTO files (path, size, mtime, data) VALUES (?, ?, ?, ?)",
+                                       (path, size, mtime, json.dumps(data)))
+                    results[path] = data
+                    uncommitted += 1
+
+                    if uncommitted >= self.commitInterval:
+                        self._conn.commit()
+                        uncommitted = 0
+
+        finally:
+            self._conn.commit()
+
+            if shutdown:
+                executor.shutdown(cancel_futures=True)
+
+        return results
+
+    def prune(self):
+        """
+        Removes entries for files that no longer exist. Returns the number of entries removed.
+        """
+        missing = [(path,) for (path,) in self._conn.execute("SELECT path FROM files") if not os.path.exists(path)]
+        self._conn.executemany("DELETE FROM files WHERE path = ?", missing)
+        self._conn.commit()
+        return len(missing)
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m matroska.index",
+                                     description="Index Matroska files into a persistent cache.")
+    parser.add_argument("paths", nargs="+", metavar="PATH", help="Files, or directories to search for Matroska files.")
+    parser.add_argument("-d", "--database", default="matroska-index.sqlite3", help="Cache database.")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Number of worker processes.")
+    parser.add_argument("--json", action="store_true", help="Write the full index of each file as JSON lines.")
+    args = parser.parse_args(argv)
+
+    failed = 0
+
+    with LibraryIndex(args.database) as library:
+        results = library.index(args.paths, workers=args.workers)
+
+    for path, data in sorted(results.items()):
+        if isinstance(data, Exception):
+            print(f"{path}: {data}", file=sys.stderr)
+            failed += 1
+
+        elif args.json:
+            print(json.dumps(dict(data, path=path)))
+
+        else:
+            duration = f"{data['duration']:.3f}s" if data["duration"] is not None else "unknown duration"
+            print(f"{path}: {len(data['tracks'])} tracks, {len(data['clusters'])} clusters, "
+                  f"{len(data['keyframes'])} keyframes, {duration}")
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
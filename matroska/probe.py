@@ -0,0 +1,126 @@
+"""
+Metadata-only inspection of Matroska files.
+"""
+
+import os
+
+__all__ = ["probe"]
+
+trackTypes = {1: "video", 2: "audio", 3: "complex", 16: "logo", 17: "subtitle", 18: "buttons", 32: "control",
+              33: "metadata"}
+
+def _default(value, default):
+    return default if value is None else value
+
+def _trackSummary(track):
+    summary = {
+            "number": track.trackNumber,
+            "uid": track.trackUID,
+            "type": trackTypes.get(track.trackType, track.trackType),
+            "codecID": track.codecID,
+            "codecName": track.codecName,
+            "name": track.name,
+            "language": track.languageIETF or _default(track.language, "eng"),
+            "default": bool(_default(track.flagDefault, 1)),
+            "forced": bool(_default(track.flagForced, 0)),
+            "enabled": bool(_default(track.flagEnabled, 1)),
+            "defaultDuration": track.defaultDuration,
+        }
+
+    video = track.video
+
+    if video is not None:
+        summary["pixelWidth"] = video.pixelWidth
+        summary["pixelHeight"] = video.pixelHeight
+        summary["displayWidth"] = _default(video.displayWidth, video.pixelWidth)
+        summary["displayHeight"] = _default(video.displayHeight, video.pixelHeight)
+
+    audio = track.audio
+
+    if audio is not None:
+        summary["samplingFrequency"] = audio.samplingFrequency
+        summary["channels"] = audio.channels
+        summary["bitDepth"] = audio.bitDepth
+
+    return summary
+
+def _chapterSummary(chapterAtom):
+    title = None
+
+    if chapterAtom.chapterDisplays:
+        title = chapterAtom.chapterDisplays[0].chapString
+
+    return {
+            "uid": chapterAtom.chapterUID,
+            "start": chapterAtom.chapterTimeStart/10**9,
+            "end": chapterAtom.chapterTimeEnd/10**9 if chapterAtom.chapterTimeEnd is not None else None,
+            "title": title,
+        }
+
+def _attachmentSummary(attachedFile):
+    return {
+            "uid": attachedFile.fileUID,
+            "fileName": attachedFile.fileName,
+            "mimeType": attachedFile.mimeType,
+            "description": attachedFile.description,
+            "size": attachedFile.fileData._size(),
+        }
+
+def probe(path):
+    """
+    Returns a dict summarizing a Matroska file: EBML head, Info, duration (in seconds), tracks, chapters (of
+    each edition) and attachments (without their data).
+
+    Only the elements before the first cluster and those referenced by the SeekHead are read. The cluster table is
+    never built, so this takes about as long for a large file as for a small one.
+    """
+
+    from .file import MatroskaFile
+
+    f = MatroskaFile(path, "r", lazy=True)
+
+    try:
+        segment = f.segment
+        info = segment.info
+        head = f.head
+
+        if info.duration is not None:
+            duration = info.duration*info.timestampScale/10**9
+
+        else:
+            duration = None
+
+        result = {
+                "path": path,
+                "size": os.path.getsize(path) if isinstance(path, str) else None,
+                "docType": head.docType,
+                "docTypeVersion": head.docTypeVersion,
+                "docTypeReadVersion": head.docTypeReadVersion,
+                "title": info.title,
+                "muxingApp": info.muxingApp,
+                "writingApp": info.writingApp,
+                "dateUTC": info.dateUTC,
+                "timestampScale": info.timestampScale,
+                "duration": duration,
+                "tracks": [_trackSummary(track) for track in segment.tracks.trackEntries],
+                "chapters": [],
+                "attachments": [],
+            }
+
+        if segment.chapters is not None:
+            for editionEntry in segment.chapters.editionEntries:
+                result["chapters"].append({
+                        "uid": editionEntry.editionUID,
+                        "default": bool(editionEntry.editionFlagDefault),
+                        "ordered": bool(editionEntry.editionFlagOrdered),
+                        "chapters": [_chapterSummary(chapterAtom) for chapterAtom in editionEntry.chapterAtoms],
+                    })
+
+        if segment.attachments is not None:
+            result["attachments"] = [_attachmentSummary(attachedFile)
+                                     for attachedFile in segment.attachments.attachedFiles]
+
+        return result
+
+    finally:
+        f.close()
@@ -0,0 +1,582 @@
+"""
+Passthrough remuxing: clusters are copied without decoding packets.
+
+Block bytes are copied verbatim. Only the block header (track number and relative timestamp) is rewritten, and only
+for blocks where either changes. Blocks of dropped tracks are left out, and Cues are carried over with updated
+offsets.
+"""
+
+from ebml.util import toVint
+
+from .blocks import SimpleBlock, Block, BlockGroup, BlockDuration, ReferenceBlock
+from .cluster import Timestamp, _blockDuration
+from .util import parseVintAt, iterElements
+
+import os
+
+__all__ = ["remux", "extract", "split", "concat", "remuxClusterData"]
+
+def _rewriteBlock(data, ebmlID, start, end, trackNumber, ptsShift=0):
+    """
+    Serializes SimpleBlock/Block element with contents data[start:end], with a different track number and/or its
+    relative timestamp shifted by 'ptsShift'.
+    """
+    oldTrackNumber, n = parseVintAt(data, start)
+    localpts = int.from_bytes(data[start + n:start + n + 2], "big", signed=True) + ptsShift
+
+    if not -2**15 <= localpts < 2**15:
+        raise ValueError("Block timestamp out of range of cluster timestamp.")
+
+    contents = toVint(trackNumber) + localpts.to_bytes(2, "big", signed=True) + bytes(data[start + n + 2:end])
+    return ebmlID + toVint(len(contents)) + contents
+
+def _timestampElement(timestamp):
+    data = timestamp.to_bytes(max(1, (timestamp.bit_length() + 7)//8), "big")
+    return Timestamp.ebmlID + toVint(len(data)) + data
+
+def _blockStats(data, start, end):
+    """Returns (trackNumber, localpts, keyframe, number of frames, payload size) of block contents data[start:end]."""
+    trackNumber, localpts, flags, offset = SimpleBlock.parseHeader(data, start)
+
+    if flags & 0b00000110:
+        frames = data[offset] + 1
+
+    else:
+        frames = 1
+
+    return (trackNumber, localpts, bool(flags & 0b10000000), frames, end - offset)
+
+def remuxClusterData(data, timestamp, timestampScale, trackMap, indexTracks=(), timestampOffset=0, window=None,
+                     defaultDurations=None):
+    """
+    Rewrites the contents of a cluster for a remux.
+
+    'data': Cluster contents (as read by Segment.readbytes).
+    'timestamp': Cluster timestamp.
+    'trackMap': dict mapping source track numbers to output track numbers. Blocks of other tracks are dropped.
+    'indexTracks': Source track numbers whose keyframes should be indexed.
+    'timestampOffset': Subtracted from all timestamps. If the cluster timestamp would become negative, it is set to
+        0 and relative block timestamps are adjusted instead.
+    'window': Tuple (start, end) of source timestamps. Blocks outside of start ≤ pts < end are dropped. Either may
+        be None.
+    'defaultDurations': dict mapping source track numbers to their DefaultDuration (in nanoseconds), used for the
+        end timestamps of blocks without a BlockDuration.
+
+    Position, PrevSize, SilentTracks, CRC-32 and Void elements are dropped, as they no longer apply to the output.
+
+    Returns a tuple (timestamp, contents, offsets, cuePoints, trackStats):
+        'timestamp': New cluster timestamp.
+        'contents': New cluster contents, or None if no blocks were kept.
+        'offsets': dict mapping offsets of kept elements in 'data' to their offsets in 'contents'.
+        'cuePoints': List of tuples (cueTime, trackNumber, relativePosition) for keyframes in 'indexTracks'.
+        'trackStats': dict mapping output track numbers to tuples (packets, bytes, endpts).
+    """
+
+    windowStart, windowEnd = window or (None, None)
+    newTimestamp = max(timestamp - timestampOffset, 0)
+    ptsShift = timestamp - timestampOffset - newTimestamp
+    data = memoryview(data)
+    chunks = []
+    offsets = {}
+    cuePoints = []
+    trackStats = {}
+    newOffset = 0
+    blockCount = 0
+
+    for offset, ebmlID, sizesize, start, end in iterElements(data):
+        if ebmlID == Timestamp.ebmlID:
+            if newTimestamp == timestamp:
+                chunk = data[offset:end]
+
+            else:
+                chunk = _timestampElement(newTimestamp)
+
+        elif ebmlID == SimpleBlock.ebmlID:
+            trackNumber, localpts, keyframe, frames, size = _blockStats(data, start, end)
+
+            if trackNumber not in trackMap or not _inWindow(timestamp + localpts, windowStart, windowEnd):
+                continue
+
+            newTrackNumber = trackMap[trackNumber]
+            blockDuration = None
+
+            if newTrackNumber == trackNumber and not ptsShift:
+                chunk = data[offset:end]
+
+            else:
+                chunk = _rewriteBlock(data, ebmlID, start, end, newTrackNumber, ptsShift)
+
+        elif ebmlID == BlockGroup.ebmlID:
+            children = list(iterElements(data, start, end))
+            blockDuration = None
+            keyframe = True
+            trackNumber = None
+
+            for childOffset, childID, childSizeSize, childStart, childEnd in children:
+                if childID == Block.ebmlID:
+                    trackNumber, localpts, _, frames, size = _blockStats(data, childStart, childEnd)
+                    blockStart, blockEnd = childStart, childEnd
+
+                elif childID == BlockDuration.ebmlID:
+                    blockDuration = int.from_bytes(data[childStart:childEnd], "big")
+
+                elif childID == ReferenceBlock.ebmlID:
+                    keyframe = False
+
+            if trackNumber not in trackMap or not _inWindow(timestamp + localpts, windowStart, windowEnd):
+                continue
+
+            newTrackNumber = trackMap[trackNumber]
+
+            if newTrackNumber == trackNumber and not ptsShift:
+                chunk = data[offset:end]
+
+            else:
+                groupChunks = []
+
+                for childOffset, childID, childSizeSize, childStart, childEnd in children:
+                    if childID == Block.ebmlID:
+                        groupChunks.append(_rewriteBlock(data, childID, blockStart, blockEnd, newTrackNumber, ptsShift))
+
+                    else:
+                        groupChunks.append(data[start + childOffset:childEnd])
+
+                contents = b"".join(groupChunks)
+                chunk = ebmlID + toVint(len(contents)) + contents
+
+        else:
+            continue
+
+        if ebmlID != Timestamp.ebmlID:
+            blockCount += 1
+            pts = timestamp + localpts - timestampOffset
+            endpts = pts*timestampScale + _blockDuration(
+                    frames, blockDuration*timestampScale if blockDuration is not None else None,
+                    (defaultDurations or {}).get(trackNumber))
+
+            prevPackets, prevSize, prevEndpts = trackStats.get(newTrackNumber, (0, 0, 0))
+            trackStats[newTrackNumber] = (prevPackets + frames, prevSize + size, max(prevEndpts, endpts))
+
+            if keyframe and trackNumber in indexTracks:
+                cuePoints.append((pts, newTrackNumber, newOffset))
+
+        offsets[offset] = newOffset
+        chunks.append(chunk)
+        newOffset += len(chunk)
+
+    if blockCount == 0:
+        return (newTimestamp, None, offsets, cuePoints, trackStats)
+
+    return (newTimestamp, b"".join(chunks), offsets, cuePoints, trackStats)
+
+def _inWindow(pts, start, end):
+    return (start is None or pts >= start) and (end is None or pts < end)
+
+def remux(src, dst, tracks=None):
+    """
+    Copies a Matroska file, keeping and renumbering tracks, without decoding or re-lacing any packets.
+
+    'src': Source file name or MatroskaFile opened in read mode.
+    'dst': Output file name or MatroskaFile opened in write mode. Track metadata, title, chapters and
+        attachments can be adjusted on it before calling remux() if passed as a MatroskaFile.
+    'tracks': dict mapping source track numbers to output track numbers, or a list of source track numbers to
+        keep. Keeps all tracks by default.
+
+    Cues from 'src' are carried over for kept tracks, with updated offsets. If 'src' has no Cues, video and
+    subtitle keyframes are indexed instead, as Segment.mux() would.
+    """
+
+    _withFiles(src, dst, tracks, _remux)
+
+def extract(src, dst, start, end=None, tracks=None):
+    """
+    Copies the time window from 'start' to 'end' (in seconds) of a Matroska file into a new file, with timestamps
+    rebased to start at 0.
+
+    The output starts at the last keyframe at or before 'start' (according to Cues, or, if there are none, found by
+    reading clusters from the start of the file), so it can be decoded without re-encoding. Clusters are copied as in remux(); only blocks outside of the window, which can only occur in the
+    first and last clusters, are dropped.
+
+    'src', 'dst', 'tracks': See remux().
+    """
+
+    _withFiles(src, dst, tracks, _remux, start=start, end=end)
+
+def _withFiles(src, dst, tracks, func, **kwargs):
+    from .file import MatroskaFile
+
+    closeSrc = isinstance(src, str)
+    closeDst = isinstance(dst, str)
+
+    if closeSrc:
+        src = MatroskaFile(src, "r")
+
+    try:
+        srcSegment = src.segment
+        trackMap = _trackMap(srcSegment, tracks)
+
+        if closeDst:
+            dst = MatroskaFile(dst, "w")
+
+        try:
+            func(srcSegment, dst.segment, trackMap, **kwargs)
+
+        finally:
+            if closeDst:
+                dst.close()
+
+    finally:
+        if closeSrc:
+            src.close()
+
+def _trackMap(srcSegment, tracks):
+    """Returns dict mapping source track numbers to output track numbers from 'tracks' (see remux())."""
+    if tracks is None:
+        trackMap = {track.trackNumber: track.trackNumber for track in srcSegment.tracks.trackEntries}
+
+    elif isinstance(tracks, dict):
+        trackMap = dict(tracks)
+
+    else:
+        trackMap = {trackNumber: trackNumber for trackNumber in tracks}
+
+    if len(set(trackMap.values())) != len(trackMap):
+        raise ValueError("Output track numbers must be unique.")
+
+    return trackMap
+
+def _setupOutput(srcSegment, segment, trackMap):
+    byTrackNumber = srcSegment.tracks.byTrackNumber
+
+    for trackNumber, newTrackNumber in trackMap.items():
+        track = segment.tracks.clone(byTrackNumber[trackNumber])
+        track.trackNumber = newTrackNumber
+
+    segment.info.timestampScale = srcSegment.info.timestampScale
+
+    if segment.info.title is None:
+        segment.info.title = srcSegment.info.title
+
+def _sourceCues(srcSegment, trackMap, windowStart=None, windowEnd=None):
+    """
+    Returns a tuple (srcCues, indexTracks), where 'srcCues' maps cluster positions to lists of tuples
+    (cueTime, trackNumber, relativePosition) from the source Cues, and 'indexTracks' are the source tracks whose
+    keyframes must be indexed because the source has no Cues.
+    """
+    srcCues = {}
+
+    if srcSegment.cues is not None and len(srcSegment.cues.cuePoints):
+        for cuePoint in srcSegment.cues.cuePoints:
+            if not _inWindow(cuePoint.cueTime, windowStart, windowEnd):
+                continue
+
+            for cueTrackPositions in cuePoint.cueTrackPositionsList:
+                if cueTrackPositions.cueTrack in trackMap:
+                    srcCues.setdefault(cueTrackPositions.cueClusterPosition, []).append(
+                        (cuePoint.cueTime, cueTrackPositions.cueTrack, cueTrackPositions.cueRelativePosition))
+
+        return (srcCues, ())
+
+    byTrackNumber = srcSegment.tracks.byTrackNumber
+    indexTracks = {trackNumber for trackNumber in trackMap
+                   if byTrackNumber[trackNumber].video is not None or byTrackNumber[trackNumber].trackType == 17}
+
+    return (srcCues, indexTracks)
+
+def _copyCluster(srcSegment, segment, cluster, data, trackMap, srcCues, indexTracks, timestampOffset=0, window=None):
+    """Copies a source cluster into 'segment' with remuxClusterData. Returns False if no blocks were kept."""
+    byTrackNumber = srcSegment.tracks.byTrackNumber
+    defaultDurations = {trackNumber: byTrackNumber[trackNumber].defaultDuration or 0 for trackNumber in trackMap}
+    timestamp, contents, offsets, cuePoints, trackStats = remuxClusterData(
+            data, cluster.timestamp, srcSegment.info.timestampScale, trackMap, indexTracks, timestampOffset, window,
+            defaultDurations)
+
+    if contents is None:
+        return False
+
+    for cueTime, trackNumber, relativePosition in srcCues.get(cluster.offsetInParent, ()):
+        if relativePosition is not None and relativePosition not in offsets:
+            continue
+
+        cuePoints.append((cueTime - timestampOffset, trackMap[trackNumber], offsets.get(relativePosition)))
+
+    segment.writeRawCluster(timestamp, contents, cuePoints, trackStats)
+    return True
+
+def _remux(srcSegment, segment, trackMap, start=None, end=None):
+    _setupOutput(srcSegment, segment, trackMap)
+
+    byTrackNumber = srcSegment.tracks.byTrackNumber
+    timestampScale = srcSegment.info.timestampScale
+    videoTracks = [trackNumber for trackNumber in trackMap if byTrackNumber[trackNumber].video is not None]
+    startPosition = 0
+    windowStart = windowEnd = None
+    timestampOffset = 0
+
+    if start is not None:
+        cuePoint = srcSegment.findCue(start, videoTracks or None)
+
+        if cuePoint is not None:
+            windowStart = cuePoint.cueTime
+            startPosition = min(cueTrackPositions.cueClusterPosition
+                                for cueTrackPositions in cuePoint.cueTrackPositionsList)
+
+        elif videoTracks:
+            windowStart, startPosition = _lastKeyframeCluster(srcSegment, start*10**9/timestampScale, videoTracks)
+
+        else:
+            windowStart = int(start*10**9/timestampScale)
+            startPosition = None
+
+        timestampOffset = windowStart
+
+    if end is not None:
+        windowEnd = end*10**9/timestampScale
+
+    srcCues, indexTracks = _sourceCues(srcSegment, trackMap, windowStart, windowEnd)
+
+    if startPosition is None:
+        clusters = srcSegment.iterClusters(start)
+
+    else:
+        clusters = srcSegment.iterClusters(startClusterPosition=startPosition)
+
+    for cluster in clusters:
+        if windowEnd is not None and cluster.timestamp >= windowEnd:
+            break
+
+        data = srcSegment.readClusterData(cluster.offsetInSegment, cluster.dataSize)
+        _copyCluster(srcSegment, segment, cluster, data, trackMap, srcCues, indexTracks, timestampOffset,
+                     (windowStart, windowEnd))
+
+    duration = srcSegment.info.duration
+
+    if start is None and end is None and duration is not None \
+            and (segment.info.duration is None or segment.info.duration < duration):
+        segment.info.duration = duration
+
+def _lastKeyframeCluster(srcSegment, timestamp, tracks):
+    """
+    Finds the last cluster whose first block of any of 'tracks' is a keyframe with timestamp ≤ 'timestamp', by
+    reading clusters from the start of the segment (for sources without Cues).
+
+    Returns a tuple (keyframe timestamp, cluster position), or (0, first cluster position) if there is none.
+    """
+    found = (0, None)
+
+    for k, cluster in enumerate(srcSegment.iterClusters()):
+        if k == 0:
+            found = (0, cluster.offsetInParent)
+
+        if cluster.timestamp > timestamp:
+            break
+
+        data = srcSegment.readClusterData(cluster.offsetInSegment, cluster.dataSize)
+        first = _firstBlock(data, tracks)
+
+        if first is not None and first[1] and cluster.timestamp + first[0] <= timestamp:
+            found = (cluster.timestamp + first[0], cluster.offsetInParent)
+
+    return found
+
+def _startsWithKeyframe(data, tracks):
+    """Whether the first block of any of 'tracks' in cluster contents 'data' is a keyframe."""
+    first = _firstBlock(data, tracks)
+    return first is not None and first[1]
+
+def _firstBlock(data, tracks):
+    """Returns (localpts, keyframe) of the first block of any of 'tracks' in cluster contents 'data', or None."""
+    data = memoryview(data)
+
+    for offset, ebmlID, sizesize, start, end in iterElements(data):
+        if ebmlID == SimpleBlock.ebmlID:
+            trackNumber, localpts, keyframe, frames, size = _blockStats(data, start, end)
+
+            if trackNumber in tracks:
+                return (localpts, keyframe)
+
+        elif ebmlID == BlockGroup.ebmlID:
+            trackNumber = None
+            keyframe = True
+
+            for childOffset, childID, childSizeSize, childStart, childEnd in iterElements(data, start, end):
+                if childID == Block.ebmlID:
+                    trackNumber, localpts = SimpleBlock.parseHeader(data, childStart)[:2]
+
+                elif childID == ReferenceBlock.ebmlID:
+                    keyframe = False
+
+            if trackNumber in tracks:
+                return (localpts, keyframe)
+
+def split(src, dst, maxSize=None, maxDuration=None, tracks=None):
+    """
+    Splits a Matroska file into parts of bounded size and/or duration, without demuxing. Parts are linked
+    segments: they share a SegmentFamily and reference each other with PrevUID/NextUID (and PrevFilename/
+    NextFilename). Each part has its own SeekHead, Cues and statistics Tags, and its timestamps start at 0.
+
+    Parts are only cut at clusters starting with a video keyframe (at any cluster if there is no video track), so a
+    part may exceed the limits if keyframes are too far apart.
+
+    'src': Source file name or MatroskaFile opened in read mode.
+    'dst': Output file name pattern, formatted with the part number (starting at 1), e.g., "part{:03d}.mkv".
+    'maxSize' (in bytes): Maximum size of clusters in each part. Headers, Cues and Tags are not counted.
+    'maxDuration' (in seconds): Maximum duration of each part.
+    'tracks': See remux().
+
+    Returns list of file names written.
+    """
+
+    from .file import MatroskaFile
+
+    if maxSize is None and maxDuration is None:
+        raise ValueError("Must specify 'maxSize' and/or 'maxDuration'.")
+
+    closeSrc = isinstance(src, str)
+
+    if closeSrc:
+        src = MatroskaFile(src, "r")
+
+    part = None
+
+    try:
+        srcSegment = src.segment
+        byTrackNumber = srcSegment.tracks.byTrackNumber
+        timestampScale = srcSegment.info.timestampScale
+        trackMap = _trackMap(srcSegment, tracks)
+        videoTracks = {trackNumber for trackNumber in trackMap if byTrackNumber[trackNumber].video is not None}
+        maxTicks = maxDuration*10**9/timestampScale if maxDuration is not None else None
+        srcCues, indexTracks = _sourceCues(srcSegment, trackMap)
+        familyUID = os.urandom(16)
+
+        paths = []
+        prevUID = None
+        uid = os.urandom(16)
+        partStart = None
+        partSize = 0
+
+        for cluster in srcSegment.iterClusters():
+            data = srcSegment.readClusterData(cluster.offsetInSegment, cluster.dataSize)
+
+            if part is not None and (not videoTracks or _startsWithKeyframe(data, videoTracks)):
+                full = ((maxSize is not None and partSize + cluster.dataSize > maxSize)
+                        or (maxTicks is not None and cluster.timestamp - partStart >= maxTicks))
+
+                if full:
+                    part.close()
+                    part = None
+
+            if part is None:
+                path = dst.format(len(paths) + 1)
+                part = MatroskaFile(path, "w")
+                info = part.segment.info
+                _setupOutput(srcSegment, part.segment, trackMap)
+                nextUID = os.urandom(16)
+                info.segmentUID = uid
+                info.segmentFamilies = [familyUID]
+
+                """
+                Set before Info is first written, so that it is written at its final size (Info is rewritten in
+                place in close()). Both are removed from the last part.
+                """
+                info.nextUID = nextUID
+                info.nextFilename = os.path.basename(dst.format(len(paths) + 2))
+
+                if prevUID is not None:
+                    info.prevUID = prevUID
+                    info.prevFilename = os.path.basename(paths[-1])
+
+                prevUID, uid = uid, nextUID
+                paths.append(path)
+                partStart = cluster.timestamp
+                partSize = 0
+
+            if _copyCluster(srcSegment, part.segment, cluster, data, trackMap, srcCues, indexTracks, partStart):
+                partSize += cluster.dataSize
+
+    finally:
+        if part is not None:
+            part.segment.info.nextUID = None
+            part.segment.info.nextFilename = None
+            part.close()
+
+        if closeSrc:
+            src.close()
+
+    return paths
+
+def _trackSignature(track):
+    video = track.video
+    audio = track.audio
+    return (track.trackNumber, track.trackType, track.codecID, track.codecPrivate, track.compression,
+            video and (video.pixelWidth, video.pixelHeight),
+            audio and (audio.samplingFrequency, audio.channels))
+
+def concat(srcs, dst):
+    """
+    Joins Matroska files with identical tracks (same track numbers, codecs and CodecPrivate) into one, without
+    demuxing. Each input's clusters are copied with their timestamps shifted by the total duration of the
+    preceding inputs, and the inputs' Cues are merged accordingly. Only one cluster is held in memory at a time.
+
+    'srcs': List of file names or MatroskaFile objects opened in read mode.
+    'dst': Output file name or MatroskaFile opened in write mode.
+    """
+
+    from .file import MatroskaFile
+
+    closeDst = isinstance(dst, str)
+
+    if closeDst:
+        dst = MatroskaFile(dst, "w")
+
+    segment = dst.segment
+    signature = timestampScale = trackMap = None
+    timestampOffset = 0
+
+    try:
+        for k, src in enumerate(srcs):
+            closeSrc = isinstance(src, str)
+
+            if closeSrc:
+                src = MatroskaFile(src, "r")
+
+            try:
+                srcSegment = src.segment
+                srcSignature = [_trackSignature(track) for track in srcSegment.tracks.trackEntries]
+
+                if k == 0:
+                    signature = srcSignature
+                    timestampScale = srcSegment.info.timestampScale
+                    trackMap = {track.trackNumber: track.trackNumber for track in srcSegment.tracks.trackEntries}
+                    _setupOutput(srcSegment, segment, trackMap)
+
+                elif srcSignature != signature:
+                    raise ValueError(f"Tracks of input {k} are not compatible with those of the first input.")
+
+                elif srcSegment.info.timestampScale != timestampScale:
+                    raise ValueError(f"TimestampScale of input {k} differs from that of the first input.")
+
+                srcCues, indexTracks = _sourceCues(srcSegment, trackMap)
+
+                for cluster in srcSegment.iterClusters():
+                    data = srcSegment.readClusterData(cluster.offsetInSegment, cluster.dataSize)
+                    _copyCluster(srcSegment, segment, cluster, data, trackMap, srcCues, indexTracks,
+                                 -timestampOffset)
+
+                duration = srcSegment.info.duration
+
+                if duration is not None:
+                    timestampOffset += int(duration + 0.5)
+
+                elif segment.info.duration is not None:
+                    timestampOffset = int(segment.info.duration + 0.5)
+
+            finally:
+                if closeSrc:
+                    src.close()
+
+        segment.info.duration = max(segment.info.duration or 0, timestampOffset)
+
+    finally:
+        if closeDst:
+            dst.close()
@@ -1,4 +1,4 @@
-from ebml.base import EBMLInteger, EBMLString, EBMLMasterElement, EBMLElement, Void, EBMLList, EBMLProperty
+from ebml.base import EBMLInteger, EBMLString, EBMLMasterElement, EBMLElement, Void, EBMLList, EBMLProperty, CRC32
 from ebml.util import peekVint, fromVint
 from ebml.document import EBMLBody
 from ebml import __version__ as ebmlversion
@@ -8,38 +8,114 @@ from .seekhead import SeekHead, Seek
 from .info import Info
 from .tracks import Tracks
 from .chapters import Chapters
-from .attachments import Attachments
-from .cluster import Cluster, Clusters
-from .cues import Cues, CueTrackPositions, CuePoint
+from .attachments import Attachments, FilePointer
+from .cluster import Cluster, Clusters, Timestamp, demuxClusterData, DemuxedBlock
+from .cues import Cues, CueTrackPositions, CuePoint, CueIndex
 from .tags import Tag, Tags, Targets, SimpleTag
 from .blocks import Packet, Block, BlockGroup, SimpleBlock
+from .util import parseElementHeaderAt
 
 import sys
+import os
+import io
 import random
 import threading
 import time
 import gc
+import heapq
+import hashlib
+import mmap as mmaplib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 __all__ = ["Segment"]
 
+class _DeferredProperty(EBMLProperty):
+    """
+    EBMLProperty for optional Segment children that, in read-only mode, are only read from their SeekHead position
+    (recorded in Segment._deferredChildren) when first accessed. Setting the property cancels the pending read.
+    """
+
+    def __get__(self, inst, owner=None):
+        if inst is None:
+            return self
+
+        deferred = inst.__dict__.get("_deferredChildren")
+
+        if deferred and self.cls.ebmlID in deferred:
+            with inst.lock:
+                offset = deferred.get(self.cls.ebmlID)
+
+                if offset is not None:
+                    position = inst.tell()
+                    inst.seek(offset)
+                    self.__set__(inst, inst.readChildElement())
+                    inst.seek(position)
+
+        return super(_DeferredProperty, self).__get__(inst, owner)
+
+    def __set__(self, inst, value):
+        deferred = inst.__dict__.get("_deferredChildren")
+
+        if deferred:
+            deferred.pop(self.cls.ebmlID, None)
+
+        super(_DeferredProperty, self).__set__(inst, value)
+
 class Segment(EBMLBody):
     ebmlID = b"\x18\x53\x80\x67"
     __ebmlchildren__ = (
             EBMLProperty("seekHead", SeekHead),
             EBMLProperty("info", Info),
             EBMLProperty("tracks", Tracks),
-            EBMLProperty("chapters", Chapters, optional=True),
-            EBMLProperty("attachments", Attachments, optional=True),
+            _DeferredProperty("chapters", Chapters, optional=True),
+            _DeferredProperty("attachments", Attachments, optional=True),
             #EBMLProperty("clusters", Clusters),
-            EBMLProperty("cues", Cues, optional=True),
-            EBMLProperty("tags", Tags, optional=True),
+            _DeferredProperty("cues", Cues, optional=True),
+            _DeferredProperty("tags", Tags, optional=True),
          )
 
     _childTypes = {Cluster.ebmlID: Cluster}
 
     allowunknown = False
 
-    def __init__(self, file, parent=None):
+    # Seconds of content between Info (Duration) rewrites while muxing. 0 rewrites it with every cluster,
+    # None only in self.close().
+    infoInterval = 0
+
+    # Flush and run a full garbage collection after every cluster.
+    syncClusters = True
+
+    # Serialize each cluster in memory and write it with a single write() call, instead of one write() per block.
+    bufferClusters = False
+
+    # Reorder packets passed to self.mux() by pts across tracks before writing them. Packets of the same track keep
+    # the order they were passed in (decode order). A packet is held until every track has a packet queued, or until
+    # the queue spans more than 'interleaveDuration' (in nanoseconds) or holds more than 'interleaveBytes'.
+    interleave = False
+    interleaveDuration = 10**9
+    interleaveBytes = 16*1024**2
+
+    # Write Cues and an updated SeekHead (and Info) after the last cluster every 'checkpointInterval' seconds of
+    # content and/or every 'checkpointClusters' clusters, so that the file stays seekable if the process dies before
+    # self.close(). The checkpoint Cues are written with free space reserved after them, and clusters are written after
+    # that space, so the Cues are never overwritten. Later checkpoints append new CuePoints in place, and only move the
+    # Cues (doubling the reserved space) once it runs out.
+    checkpointInterval = None
+    checkpointClusters = None
+
+    # Bytes left free after the header elements (Info, Tracks, Chapters, Attachments) when muxing, so that they can
+    # later be edited in place (see self.rewriteChildElement).
+    headerPadding = 0
+
+    # Added to the pts (in nanoseconds) of packets passed to self.mux(). Set in append mode, so that new packets
+    # continue after the existing ones.
+    ptsOffset = 0
+
+    def __init__(self, file, parent=None, lazy=False, mmap=False, clusterCache=None):
+        self._lazy = lazy
+        self.clusterCache = clusterCache
+        self._scanned = not lazy
         self._clustersByOffset = {}
         self._clustersByTimestamp = {}
         self._lastClusterEnd = None
@@ -47,11 +123,40 @@ class Segment(EBMLBody):
         self._currentBlocks = {}
         self._blocksToIndex = set()
         self._packetsMuxed = 0
+        self._muxInitialized = False
         self._trackPackets = {}
         self._trackBytes = {}
         self._trackDurations = {}
         self._seekHead = None
         self._seekHeadOffset = None
+        self._deferredChildren = {}
+        self._infoDuration = None
+        self._checkpointOffset = None
+        self._checkpointCapacity = 0
+        self._checkpointTail = 0
+        self._checkpointWritten = 0
+        self._checkpointDuration = 0
+        self._editMode = False
+        self._editState = {}
+        self._slots = {}
+        self._checkpointClusterCount = 0
+        self._checkpointCueCount = 0
+        self._checkpointCueData = bytearray()
+        self._interleaveQueues = {}
+        self._interleaveHeap = []
+        self._interleaveSeq = 0
+        self._interleaveSize = 0
+        self._interleaveMaxPts = None
+        self._cueIndex = None
+        self._preadfd = None
+        self._contentsOffset = None
+        self._mmap = None
+        self._map = None
+
+        if mmap:
+            self._mmap = mmaplib.mmap(file.fileno(), 0, access=mmaplib.ACCESS_READ)
+            self._map = memoryview(self._mmap)
+
         super(Segment, self).__init__(file, parent=parent)
 
     @property
@@ -90,6 +195,8 @@ class Segment(EBMLBody):
 
         offset = self.tell()
 
+        defer = not self._file.writable()
+
         if self.seekHead:
             for seek in self.seekHead.seeks:
                 for prop in self.__ebmlchildren__:
@@ -99,13 +206,104 @@ class Segment(EBMLBody):
                         except AttributeError:
                             attributeDNE = True
                         if attributeDNE:
+                            if defer and isinstance(prop, _DeferredProperty):
+                                """Read on first access (see _DeferredProperty)."""
+                                self._deferredChildren.setdefault(seek.seekID, seek.seekPosition)
+                                continue
+
                             self.seek(seek.seekPosition)
                             prop.__set__(self, self.readChildElement())
 
-        self.seek(0)
-        self.scan()
+        if not self._lazy:
+            self.seek(0)
+            self.scan()
+
+        self._initPositionalReads()
+
+    def _initPositionalReads(self):
+        """
+        Enables lock-free positional reads (os.pread, or slicing the memory map if opened with mmap=True) in
+        self.readbytes when the file is read-only and has a file descriptor.
+        """
+        if self._map is None:
+            if not hasattr(os, "pread") or self._file.writable():
+                return
+
+            try:
+                fd = self._file.fileno()
+
+            except (AttributeError, io.UnsupportedOperation, OSError):
+                return
+
+        else:
+            fd = None
+
+        with self.lock:
+            current = self.tell()
+            self.seek(0)
+            self._contentsOffset = self._file.tell()
+            self.seek(current)
+
+        self._preadfd = fd
+
+    def _ensureScanned(self):
+        """
+        Scans the entire segment for clusters, if this has not already been done (i.e., opened with lazy=True).
+        """
+        if self._scanned:
+            return
+
+        with self.lock:
+            if not self._scanned:
+                current = self.tell()
+                self.seek(0)
+                self.scan()
+                self.seek(current)
+                self._scanned = True
+
+    def _registerCluster(self, cluster, offset):
+        cluster.offsetInParent = offset
+        self._clustersByOffset[cluster.offsetInSegment] = cluster
+        self._clustersByTimestamp[cluster.timestamp] = cluster
+
+    def _clusterHeaderOffset(self, cluster):
+        """
+        Returns the offset of the Cluster element header that ends at 'cluster.offsetInSegment'. readCluster() skips
+        whatever precedes the cluster (SeekHead, Info, Tracks, Cues, Void, ...), so the offset it was read from
+        cannot be used.
+        """
+        idsize = len(Cluster.ebmlID)
+        start = max(0, cluster.offsetInSegment - idsize - 8)
+        header = self.readbytes(start, cluster.offsetInSegment - start)
+
+        for sizesize in range(1, 9):
+            k = len(header) - idsize - sizesize
+
+            if k < 0:
+                break
+
+            if header[k:k + idsize] == Cluster.ebmlID and 9 - header[k + idsize].bit_length() == sizesize:
+                return start + k
+
+    def _nearestKnownCluster(self, timestamp):
+        """
+        Returns offset of the last cluster already discovered whose timestamp is < 'timestamp', or 0 if there is none.
+        """
+        offset = 0
+        best = None
+
+        for ts, cluster in list(self._clustersByTimestamp.items()):
+            if ts < timestamp and (best is None or ts > best) and getattr(cluster, "offsetInParent", None) is not None:
+                best = ts
+                offset = cluster.offsetInParent
+
+        return offset
 
     def _init_write(self):
+        self._init_children()
+        super(Segment, self)._init_write()
+
+    def _init_children(self):
         self.seekHead = SeekHead([], parent=self)
 
         self.info = Info(timestampScale=10**6, writingApp="",
@@ -118,33 +316,73 @@ class Segment(EBMLBody):
         self.cues = Cues([])
         self.tags = Tags([])
 
-        super(Segment, self)._init_write()
+    @property
+    def cueIndex(self):
+        """
+        Sorted index over self.cues (see matroska.cues.CueIndex). Rebuilt when Cues is replaced or modified.
+        """
+
+        cues = self.cues
+
+        if cues is None:
+            return
+
+        cueIndex = self._cueIndex
+
+        if cueIndex is None or cueIndex.cues is not cues or cueIndex.length != len(cues.cuePoints):
+            cueIndex = self._cueIndex = CueIndex(cues)
+
+        return cueIndex
+
+    def _findCuePosition(self, start_pts=0, trackNumber=None):
+        cueIndex = self.cueIndex
+
+        if cueIndex is not None:
+            return cueIndex.find(10**9*start_pts/self.info.timestampScale, trackNumber)
 
     def findCue(self, start_pts=0, trackNumber=None):
         """
         Attempts to find CuePoint element.
         """
 
-        if self.cues is None:
-            return
+        found = self._findCuePosition(start_pts, trackNumber)
 
-        cuePoint = None
+        if found is not None:
+            return self.cues.cuePoints[found[0]]
 
-        for cuePoint2 in self.cues.cuePoints:
-            for cueTrackPosition in cuePoint2.cueTrackPositionsList:
-                if trackNumber is None or cueTrackPosition.cueTrack == trackNumber:
-                    break
-            else:
-                continue
+    def readbytes(self, offset, size):
+        """
+        Reads 'size' bytes at 'offset' (relative to the start of the segment contents).
+
+        In read-only mode, this uses os.pread, so it neither takes self.lock nor moves the file position, and may be
+        called concurrently from several threads. If the file was opened with mmap=True, a memoryview into the
+        memory map is returned instead of bytes.
+        """
+        if self._map is not None:
+            position = self._contentsOffset + offset
+            return self._map[position:position + size]
 
-            if cuePoint2.cueTime > 10**9*start_pts/self.info.timestampScale:
-                return cuePoint
+        if self._preadfd is not None:
+            position = self._contentsOffset + offset
+            data = os.pread(self._preadfd, size, position)
 
-            cuePoint = cuePoint2
+            if len(data) == size or not data:
+                return data
 
-        return cuePoint
+            chunks = [data]
+            remaining = size - len(data)
+
+            while remaining:
+                chunk = os.pread(self._preadfd, remaining, position + size - remaining)
+
+                if not chunk:
+                    break
+
+                chunks.append(chunk)
+                remaining -= len(chunk)
+
+            return b"".join(chunks)
 
-    def readbytes(self, offset, size):
         with self.lock:
             current = self.tell()
             self.seek(offset)
@@ -153,13 +391,21 @@ class Segment(EBMLBody):
 
         return data
 
+    def readClusterData(self, offset, size):
+        """
+        Reads cluster contents, going through self.clusterCache (a matroska.cluster.ClusterCache), if set.
+        """
+        if self.clusterCache is None or self._map is not None:
+            return self.readbytes(offset, size)
+
+        return self.clusterCache.get(offset, size, self.readbytes)
+
     def readChildElement(self):
         offset = self.tell()
         child = super().readChildElement()
 
         if isinstance(child, Cluster):
-            self._clustersByOffset[child.offsetInSegment] = child
-            self._clustersByTimestamp[child.timestamp] = child
+            self._registerCluster(child, offset)
 
         if isinstance(child, SeekHead):
             self._seekHeadOffset = offset
@@ -174,10 +420,16 @@ class Segment(EBMLBody):
     def writeChildElement(self, child):
         offset = super().writeChildElement(child)
 
+        if self.clusterCache is not None:
+            self.clusterCache.clear()
+
         if isinstance(child, Cluster):
             self._clustersByOffset[offset] = child
             self._clustersByTimestamp[child.timestamp] = child
 
+        if isinstance(child, SeekHead):
+            self._seekHeadOffset = offset
+
         if isinstance(child, (Info, Tracks,
                               Attachments, Cues,
                               Tags, Chapters)):
@@ -194,6 +446,9 @@ class Segment(EBMLBody):
     def deleteChildElement(self, offset):
         super().deleteChildElement(offset)
 
+        if self.clusterCache is not None:
+            self.clusterCache.clear()
+
         for seek in list.copy(self.seekHead.seeks):
             if seek.seekPosition == offset:
                 self.seekHead.seeks.remove(seek)
@@ -210,29 +465,31 @@ class Segment(EBMLBody):
                 if len(cuePoint.cueTrackPositionsList) == 0:
                     self.cues.cuePoints.remove(cuePoint)
 
+            self._cueIndex = None
+
     def iterClusters(self, start_pts=0, startClusterPosition=None, trackNumber=None):
         if startClusterPosition is None:
             try:
-                cuePoint = self.findCue(start_pts, trackNumber)
+                found = self._findCuePosition(start_pts, trackNumber)
 
             except AttributeError:
-                cuePoint = None
+                found = None
 
-            if cuePoint is not None:
-                for cueTrackPosition in cuePoint.cueTrackPositionsList:
-                    if trackNumber is None or cueTrackPosition.cueTrack == trackNumber:
-                        break
-
-                offset = cueTrackPosition.cueClusterPosition
+            if found is not None:
+                offset = found[1]
 
             else:
-                offset = 0
+                offset = None
 
         else:
             offset = startClusterPosition
 
         cutoff = 10**9*start_pts/self.info.timestampScale - 32768
 
+        if offset is None:
+            """No cue available. Start from the closest cluster discovered so far."""
+            offset = self._nearestKnownCluster(cutoff)
+
         while offset < self._contentssize:
             with self.lock:
                 self.seek(offset)
@@ -240,12 +497,15 @@ class Segment(EBMLBody):
                 offset = self.tell()
 
             if cluster:
+                self._registerCluster(cluster, self._clusterHeaderOffset(cluster))
+
                 if cluster.timestamp < cutoff:
                     continue
 
                 yield cluster
 
-    def iterPackets(self, start_pts=0, startClusterPosition=None, startBlockPosition=0, trackNumber=None):
+    def iterPackets(self, start_pts=0, startClusterPosition=None, startBlockPosition=0, trackNumber=None,
+                    workers=None, executor=None):
         """
         Create an iterator that yields packets contained in segment.
 
@@ -255,6 +515,9 @@ class Segment(EBMLBody):
         'startBlockPosition' (in bytes): Starts demuxing at this offset inside the first cluster. Raises an exception if a child
             element does NOT start at this offset.
         'trackNumber': Filters by trackNumber. Can be either an integer or list/tuple of integers.
+        'workers': Parse clusters in parallel using a pool of this many worker processes. Packets are still yielded in
+            order, with up to 2*workers clusters read ahead.
+        'executor': A concurrent.futures.Executor to use instead of creating a process pool.
 
         Both 'startClusterPosition' and 'startBlockPosition' are values that can be looked up in the Cues element
         (from the CueClusterPosition and CueRelativePosition elements). See 'self.findCue'.
@@ -262,6 +525,11 @@ class Segment(EBMLBody):
 
         clusters = self.iterClusters(start_pts, startClusterPosition=startClusterPosition, trackNumber=trackNumber)
 
+        if workers is not None or executor is not None:
+            yield from self._iterPacketsParallel(clusters, start_pts, startBlockPosition, trackNumber,
+                                                 workers, executor)
+            return
+
         for k, cluster in enumerate(clusters):
             if k == 0:
                 packets = cluster.iterPackets(start_pts=start_pts, startPosition=startBlockPosition, trackNumber=trackNumber)
@@ -272,8 +540,70 @@ class Segment(EBMLBody):
             for packet in packets:
                 yield packet
 
+    def _iterPacketsParallel(self, clusters, start_pts, startBlockPosition, trackNumber, workers, executor):
+        tracks = {track.trackNumber: (track.defaultDuration, track.compression) for track in self.tracks.trackEntries}
+        timestampScale = self.info.timestampScale
+        readAhead = 2*workers if workers else 8
+        shutdown = executor is None
+
+        if executor is None:
+            executor = ProcessPoolExecutor(max_workers=workers)
+
+        pending = deque()
+
+        try:
+            for k, cluster in enumerate(clusters):
+                data = bytes(self.readClusterData(cluster.offsetInSegment, cluster.dataSize))
+                future = executor.submit(demuxClusterData, data, cluster.timestamp, timestampScale, tracks,
+                                         start_pts, startBlockPosition if k == 0 else 0, trackNumber)
+                pending.append((cluster, future))
+
+                while len(pending) >= readAhead:
+                    pendingCluster, future = pending.popleft()
+                    yield from self._packetsFromTuples(future.result(), self._demuxedBlocks(pendingCluster))
+
+            while pending:
+                pendingCluster, future = pending.popleft()
+                yield from self._packetsFromTuples(future.result(), self._demuxedBlocks(pendingCluster))
+
+        finally:
+            for pendingCluster, future in pending:
+                future.cancel()
+
+            if shutdown:
+                executor.shutdown()
+
+    def _demuxedBlocks(self, cluster):
+        return {trackEntry.trackNumber: DemuxedBlock(cluster, trackEntry) for trackEntry in self.tracks.trackEntries}
+
+    @staticmethod
+    def _packetsFromTuples(packets, parents=None):
+        """
+        Builds Packet objects from demuxClusterData output. 'parents' optionally maps track numbers to the
+        DemuxedBlock each packet is given as its parent.
+        """
+        for (trackNumber, data, compression, pts, duration, keyframe,
+                invisible, discardable, referenceBlocks) in packets:
+            parent = parents.get(trackNumber) if parents is not None else None
+
+            if compression is not None:
+                packet = Packet(trackNumber, zdata=data, compression=compression, pts=pts, duration=duration,
+                                keyframe=keyframe, invisible=invisible, discardable=discardable,
+                                referenceBlocks=referenceBlocks, parent=parent)
+
+            else:
+                packet = Packet(trackNumber, data=data, pts=pts, duration=duration, keyframe=keyframe,
+                                invisible=invisible, discardable=discardable, referenceBlocks=referenceBlocks,
+                                parent=parent)
+
+            if parents is not None:
+                """Read-only, like the packets Cluster.iterPackets yields."""
+                packet.readonly = True
+
+            yield packet
+
     def writeCluster(self):
-        clusterOffset = self._lastClusterEnd or self.tell()
+        clusterOffset = self._nextClusterOffset()
 
         inClusterOffset = 0
 
@@ -284,35 +614,245 @@ class Segment(EBMLBody):
 
                 cuePoint = CuePoint(cueTime=item.pts, cueTrackPositionsList=[cueTrackPositions])
                 self.cues.cuePoints.append(cuePoint)
+                self._cueIndex = None
 
             inClusterOffset += item.size()
 
         with self.lock:
-            n = self.infoOffset
-
-            if n in self._knownChildren:
-                self.deleteChildElement(n)
+            if self._infoUpdateDue():
+                self._writeInfo()
 
-            self.seek(n)
-            self.writeChildElement(self.info.copy())
             self.seek(clusterOffset)
             self._lastClusterEnd = clusterOffset + self._currentCluster.size()
             self.writeChildElement(self._currentCluster)
-            self.flush()
+
+            if self.syncClusters:
+                self.flush()
 
         self._currentCluster = None
         self._currentBlocks.clear()
         self._blocksToIndex.clear()
-        gc.collect()
+        self._checkpointIfDue()
+
+        if self.syncClusters:
+            gc.collect()
+
+    def writeRawCluster(self, timestamp, data, cuePoints=None, trackStats=None):
+        """
+        Writes an already serialized cluster, bypassing packet muxing. Any cluster being built by self.mux() is
+        written first.
+
+        'timestamp': Cluster timestamp (in self.info.timestampScale units), which must match the Timestamp element
+            in 'data'.
+        'data': Cluster contents (Timestamp, blocks, ...), without the Cluster element header.
+        'cuePoints': List of tuples (cueTime, trackNumber, relativePosition) to index, where 'relativePosition' is
+            the offset of the block inside 'data'.
+        'trackStats': dict mapping track numbers to tuples (packets, bytes, endpts), added to the statistics written
+            as Tags in self.close(). 'endpts' is in nanoseconds.
+
+        Returns the offset of the cluster in the segment.
+        """
+
+        if not self._muxInitialized:
+            self._init_mux()
+
+        if self._currentCluster is not None:
+            self.writeCluster()
+
+        clusterOffset = self._nextClusterOffset()
+
+        if cuePoints:
+            for cueTime, trackNumber, relativePosition in cuePoints:
+                cueTrackPositions = CueTrackPositions(cueClusterPosition=clusterOffset,
+                                                      cueRelativePosition=relativePosition, cueTrack=trackNumber)
+
+                self.cues.cuePoints.append(CuePoint(cueTime=cueTime, cueTrackPositionsList=[cueTrackPositions]))
+
+            self._cueIndex = None
+
+        if trackStats:
+            for trackNumber, (packets, size, endpts) in trackStats.items():
+                self._trackPackets[trackNumber] = self._trackPackets.get(trackNumber, 0) + packets
+                self._trackBytes[trackNumber] = self._trackBytes.get(trackNumber, 0) + size
+
+                if endpts is not None:
+                    self._trackDurations[trackNumber] = max(self._trackDurations.get(trackNumber, 0), endpts/10**9)
+
+                    if self.info.duration is None or self.info.duration < endpts/self.info.timestampScale:
+                        self.info.duration = endpts/self.info.timestampScale
+
+        cluster = Cluster(timestamp=timestamp, parent=self, rawData=data)
+
+        with self.lock:
+            if self._infoUpdateDue():
+                self._writeInfo()
+
+            self.seek(clusterOffset)
+            self._lastClusterEnd = clusterOffset + cluster.size()
+            self.writeChildElement(cluster)
+
+            if self.syncClusters:
+                self.flush()
+
+        self._checkpointIfDue()
+        return clusterOffset
+
+    def _checkpointIfDue(self):
+        self._checkpointClusterCount += 1
+
+        if self.checkpointClusters is not None and self._checkpointClusterCount >= self.checkpointClusters:
+            self.checkpoint()
+
+        elif self.checkpointInterval is not None and self.info.duration is not None:
+            if (self.info.duration - self._checkpointDuration)*self.info.timestampScale >= self.checkpointInterval*10**9:
+                self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Brings the Cues on disk up to date with the CuePoints accumulated so far, then rewrites Info and, if the
+        Cues moved, the SeekHead, so that the file is seekable even if self.close() is never called. Called
+        automatically according to self.checkpointInterval and self.checkpointClusters.
+
+        Only CuePoints added since the last checkpoint are serialized and written, into the space reserved after the
+        Cues. When that runs out, the Cues are written again after the last cluster with twice the space reserved,
+        and the SeekHead is pointed at them before the old Cues are voided, so the SeekHead on disk always points
+        at complete Cues.
+        """
+        if not self._muxInitialized:
+            return
+
+        cuePoints = self.cues.cuePoints
+        data = self._checkpointCueData
+
+        if len(cuePoints) < self._checkpointCueCount:
+            """Cue points were removed. Serialize them all again."""
+            self._checkpointCueCount = 0
+            self._checkpointWritten = None
+            data.clear()
+
+        for cuePoint in cuePoints[self._checkpointCueCount:]:
+            data.extend(cuePoint.toBytes())
+
+        self._checkpointCueCount = len(cuePoints)
+
+        with self.lock:
+            written = self._checkpointWritten
+            free = self._checkpointCapacity - len(data)
+
+            if self._checkpointOffset is not None and written is not None and (free == 0 or free >= 2):
+                """Append to the Cues in place: reserved space first, then new CuePoints, then the Cues size."""
+                dataOffset = self._checkpointOffset + 12
+
+                if free:
+                    self._writeVoid(dataOffset + len(data), free)
+
+                self.seek(dataOffset + written)
+                self._file.write(bytes(data[written:]))
+                self.seek(self._checkpointOffset)
+                self._file.write(self._cuesHeader(len(data)))
+                self._writeInfo()
+
+            else:
+                oldOffset = self._checkpointOffset
+                oldCapacity = self._checkpointCapacity
+                offset = self._nextClusterOffset()
+                capacity = max(2*len(data), 4096)
+
+                self.seek(offset)
+                self._file.write(self._cuesHeader(len(data)))
+                self._file.write(bytes(data))
+                self._writeVoid(offset + 12 + len(data), capacity - len(data))
+
+                self._checkpointOffset = offset
+                self._checkpointCapacity = capacity
+
+                if self._contentssize < offset + 12 + capacity:
+                    """Written directly, so not accounted for by self.writeChildElement()."""
+                    self._contentssize = offset + 12 + capacity
+
+                self.seekHead[Cues] = offset
+                self._writeInfo()
+
+                """A SeekHead that outgrows its slot is moved right after the reserved space, and moves along with the
+                Cues from then on."""
+                oldTail = self._checkpointTail
+                tailOffset = offset + 12 + capacity
+                moved = self._rewriteSeekHead(tailOffset)
+                self._checkpointTail = moved - tailOffset if moved is not None else 0
+
+                if oldOffset is not None:
+                    self.flush()
+                    self._writeVoid(oldOffset, 12 + oldCapacity + oldTail)
+
+            self._checkpointWritten = len(data)
+            self.seek(self._nextClusterOffset())
+            self.flush()
+
+        self._checkpointDuration = self.info.duration or 0
+        self._checkpointClusterCount = 0
+
+    @staticmethod
+    def _cuesHeader(size):
+        """Cues element header with an 8-byte size, so that the size can be updated in place."""
+        return Cues.ebmlID + (2**56 | size).to_bytes(8, "big")
+
+    def _nextClusterOffset(self):
+        """
+        Offset the next cluster is written at: after the last cluster, or after the checkpoint Cues' space (and the
+        SeekHead, if it was moved there).
+        """
+        offset = self._lastClusterEnd or self.tell()
+
+        if self._checkpointOffset is not None:
+            offset = max(offset, self._checkpointOffset + 12 + self._checkpointCapacity + self._checkpointTail)
+
+        return offset
+
+    def _infoUpdateDue(self):
+        if self.infoInterval is None:
+            return False
+
+        if self.infoInterval == 0 or self._infoDuration is None:
+            return True
+
+        if self.info.duration is None:
+            return False
+
+        return (self.info.duration - self._infoDuration)*self.info.timestampScale >= self.infoInterval*10**9
+
+    def _writeInfo(self):
+        """
+        (Re)writes Info at its current offset. Caller must hold self.lock and restore the file position.
+
+        Returns False, leaving Info on disk as it was, if Info has grown past the space left for it before the next
+        element. self.close() then moves it after the Cues and Tags.
+        """
+        n = self.infoOffset
+
+        if n in self._knownChildren:
+            if not self._writeInSlot(self.info.copy(), n):
+                return False
+
+        else:
+            self.seek(n)
+            self.writeChildElement(self.info.copy())
+
+        self._infoDuration = self.info.duration
+        return True
 
     def _newBlockGroup(self, trackNumber):
         pass
 
     def _init_mux(self):
+        self._muxInitialized = True
         self.seek(128)
-        self.writeChildElement(self.info.copy())
+        infoOffset = self.writeChildElement(self.info.copy())
+        self._infoDuration = self.info.duration
         self.seek(128, 1)
-        self.writeChildElement(self.tracks)
+        tracksOffset = self.writeChildElement(self.tracks)
+
+        """The output is never read back to find the space Info and SeekHead can be rewritten in."""
+        self._slots = {0: infoOffset, infoOffset: tracksOffset - infoOffset}
 
         if len(self.chapters.editionEntries):
             self.writeChildElement(self.chapters)
@@ -326,12 +866,119 @@ class Segment(EBMLBody):
         elif not self.attachments.readonly:
             self.attachments.readonly = True
 
+        if self.headerPadding:
+            self.seek(self.headerPadding, 1)
+
+        """Written now, so that checkpoints and self.close() can rewrite it in its slot (see self._rewriteSeekHead)."""
+        end = self.tell()
+        self.seek(0)
+        self.writeChildElement(self.seekHead)
+        self.seek(end)
         self.flush()
 
         self._trackPackets = {track.trackNumber: 0 for track in self.tracks.trackEntries}
         self._trackBytes = {track.trackNumber: 0 for track in self.tracks.trackEntries}
         self._trackDurations = {track.trackNumber: 0 for track in self.tracks.trackEntries}
 
+    def _init_append(self):
+        """
+        Prepares a finished file, opened for reading and writing, for muxing more packets after its last cluster.
+
+        Cues and Tags are voided and written again by self.close(), with the statistics tags updated from their
+        previous values.
+
+        Raises ValueError if anything other than Cues, Tags or Void follows the last cluster, as it would be
+        overwritten.
+        """
+        self._ensureScanned()
+
+        if self._clustersByOffset:
+            cluster = self._clustersByOffset[max(self._clustersByOffset)]
+            self._lastClusterEnd = cluster.offsetInSegment + cluster.dataSize
+
+        else:
+            self._lastClusterEnd = self._contentssize
+
+        """New clusters are written over whatever follows the last cluster, which must not be needed anymore."""
+        offset = self._lastClusterEnd
+
+        while offset < self._contentssize:
+            ebmlID, sizesize, dataSize, dataOffset = parseElementHeaderAt(self.readbytes(offset, 12))
+
+            if ebmlID not in (Cues.ebmlID, Tags.ebmlID, Void.ebmlID) or dataSize is None:
+                raise ValueError(f"Cannot append to file: element {ebmlID.hex()} at offset {offset} follows the last "
+                                 "cluster.")
+
+            offset += dataOffset + dataSize
+
+        self.info = self.info.copy(parent=self)
+        self.cues = self.cues.copy(parent=self) if self.cues is not None else Cues([])
+        self._cueIndex = None
+
+        self._trackPackets = {track.trackNumber: 0 for track in self.tracks.trackEntries}
+        self._trackBytes = {track.trackNumber: 0 for track in self.tracks.trackEntries}
+        self._trackDurations = {track.trackNumber: 0 for track in self.tracks.trackEntries}
+
+        tags = Tags([])
+
+        if self.tags is not None:
+            byTrackUID = {track.trackUID: track.trackNumber for track in self.tracks.trackEntries}
+
+            for tag in self.tags.tagList:
+                if not self._seedStatsTag(tag, byTrackUID):
+                    tags.tagList.append(tag.copy())
+
+        self.tags = tags
+
+        """Measured once, so that Info and SeekHead rewrites while muxing do not read the file back."""
+        for offset in (self._seekHeadOffset, self.infoOffset):
+            if offset is not None:
+                self._slots[offset] = self._slotSize(offset)
+
+        for seek in list.copy(self.seekHead.seeks):
+            if seek.seekID in (Cues.ebmlID, Tags.ebmlID):
+                self.deleteChildElement(seek.seekPosition)
+
+        self._muxInitialized = True
+        self._infoDuration = self.info.duration
+        self.ptsOffset = int((self.info.duration or 0)*self.info.timestampScale)
+        self.seek(self._lastClusterEnd)
+
+    def _seedStatsTag(self, tag, byTrackUID):
+        """
+        If 'tag' holds statistics written by self.makeStatsTags() for a single track, adds them to the statistics
+        counters and returns True.
+        """
+        simpleTags = {simpleTag.tagName: simpleTag.tagString for simpleTag in tag.simpleTags}
+
+        if "_STATISTICS_TAGS" not in simpleTags or tag.targets is None or tag.targets.tagTrackUIDs is None:
+            return False
+
+        trackUIDs = list(tag.targets.tagTrackUIDs)
+
+        if len(trackUIDs) != 1 or trackUIDs[0] not in byTrackUID:
+            return False
+
+        trackNumber = byTrackUID[trackUIDs[0]]
+
+        try:
+            packets = int(simpleTags.get("NUMBER_OF_FRAMES") or 0)
+            size = int(simpleTags.get("NUMBER_OF_BYTES") or 0)
+            duration = 0
+
+            if simpleTags.get("DURATION"):
+                h, m, s = simpleTags["DURATION"].split(":")
+                duration = 3600*int(h) + 60*int(m) + float(s)
+
+        except ValueError:
+            return False
+
+        """Counters are only updated once every value has been parsed."""
+        self._trackPackets[trackNumber] += packets
+        self._trackBytes[trackNumber] += size
+        self._trackDurations[trackNumber] = max(self._trackDurations[trackNumber], duration)
+        return True
+
     def mux(self, packet, newcluster=False, cuepoint=False):
         """
         Writes a packet to file. Automatically handles creation of Cluster, SimpleBlock, BlockGroup+Block
@@ -343,11 +990,95 @@ class Segment(EBMLBody):
 
         Returns number of bytes written, accounting for compression,
         excluding BlockGroup+Block/SimpleBlock overhead.
+
+        If self.interleave is True, the packet is queued instead (see Segment.interleave), and the number of bytes
+        of the queued packets released by this call is returned.
         """
 
         if not isinstance(packet, Packet):
             packet = Packet.copy(packet)
 
+        if self.ptsOffset and packet.pts is not None:
+            packet = packet.copy()
+            packet.pts += self.ptsOffset
+
+        if not self.interleave:
+            return self._mux(packet, newcluster, cuepoint)
+
+        trackNumber = packet.trackNumber
+
+        if trackNumber not in self.tracks.byTrackNumber:
+            raise KeyError(trackNumber)
+
+        pts = packet.pts
+
+        if pts is None:
+            """Keep packets without pts behind everything already queued."""
+            pts = self._interleaveMaxPts or 0
+
+        if self._interleaveMaxPts is None or pts > self._interleaveMaxPts:
+            self._interleaveMaxPts = pts
+
+        """Each track has its own FIFO queue. The heap only holds the head packet of each non-empty queue, so
+        packets of a track are never reordered among themselves (e.g., B-frames stay in decode order)."""
+        queue = self._interleaveQueues.get(trackNumber)
+
+        if queue is None:
+            queue = self._interleaveQueues[trackNumber] = deque()
+
+        queue.append((pts, self._interleaveSeq, packet, newcluster, cuepoint))
+
+        if len(queue) == 1:
+            heapq.heappush(self._interleaveHeap, (pts, self._interleaveSeq, trackNumber))
+
+        self._interleaveSeq += 1
+        self._interleaveSize += packet.size or 0
+
+        ntracks = len(self.tracks.trackEntries)
+        written = 0
+
+        while self._interleaveHeap:
+            pts = self._interleaveHeap[0][0]
+
+            if (len(self._interleaveQueues) < ntracks
+                    and self._interleaveMaxPts - pts <= self.interleaveDuration
+                    and self._interleaveSize <= self.interleaveBytes):
+                break
+
+            written += self._releaseInterleaved()
+
+        return written
+
+    def _releaseInterleaved(self):
+        pts, seq, trackNumber = heapq.heappop(self._interleaveHeap)
+        queue = self._interleaveQueues[trackNumber]
+        pts, seq, packet, newcluster, cuepoint = queue.popleft()
+        self._interleaveSize -= packet.size or 0
+
+        if queue:
+            pts, seq = queue[0][:2]
+            heapq.heappush(self._interleaveHeap, (pts, seq, trackNumber))
+
+        else:
+            del self._interleaveQueues[trackNumber]
+
+        return self._mux(packet, newcluster, cuepoint)
+
+    def flushInterleaved(self):
+        """
+        Writes all packets held in the interleaving queue. Called automatically by self.close().
+
+        Returns number of bytes written.
+        """
+        written = 0
+
+        while self._interleaveHeap:
+            written += self._releaseInterleaved()
+
+        self._interleaveMaxPts = None
+        return written
+
+    def _mux(self, packet, newcluster=False, cuepoint=False):
         timestampScale = self.info.timestampScale
 
         trackEntry = self.tracks.byTrackNumber[packet.trackNumber]
@@ -371,8 +1102,10 @@ class Segment(EBMLBody):
         newClusterNeeded = (nonemptyCluster and (isVideoKeyframe or ptsOverflow or newcluster)
                             and packet.pts > self._currentCluster.timestamp*timestampScale)
 
-        if self._packetsMuxed == 0:
+        if not self._muxInitialized:
             self._init_mux()
+
+        if self._currentCluster is None:
             self._currentCluster = Cluster(timestamp=int(packet.pts/timestampScale),
                                                         blocks=[], parent=self)
 
@@ -488,12 +1221,352 @@ class Segment(EBMLBody):
             tag = Tag(simpleTags=simpleTags, targets=targets)
             self.tags.tagList.append(tag)
 
+    _editableElements = (("info", Info), ("tracks", Tracks), ("chapters", Chapters), ("attachments", Attachments),
+                         ("tags", Tags))
+
+    def _init_edit(self):
+        """
+        Prepares a file, opened for reading and writing, for editing its metadata (Info, Tracks, Chapters,
+        Attachments, Tags). Modified elements are written back by self.close(). Clusters are never touched, nor
+        scanned.
+        """
+        self._editMode = True
+
+        for name, cls in self._editableElements:
+            element = getattr(self, name)
+
+            if element is not None:
+                setattr(self, name, element.copy(parent=self))
+
+            elif cls not in (Info, Tracks):
+                setattr(self, name, cls([], parent=self))
+
+            self._editState[name] = self._elementState(name)
+
+    def _elementState(self, name):
+        element = getattr(self, name)
+
+        if element is None:
+            return
+
+        if isinstance(element, Attachments):
+            """Avoids reading attachment data that is still in the file."""
+            return [(attachedFile.fileName, attachedFile.mimeType, attachedFile.fileUID, attachedFile.description,
+                     self._dataState(attachedFile.fileData.data)) for attachedFile in element.attachedFiles]
+
+        return element.toBytes()
+
+    @staticmethod
+    def _dataState(data):
+        if isinstance(data, FilePointer):
+            return ("file", data.offset, data.size)
+
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return ("bytes", len(data), hashlib.sha1(data).digest())
+
+        """Any other reader is new data."""
+        return ("reader", data)
+
+    def _commitEdits(self):
+        for name, cls in self._editableElements:
+            if self._elementState(name) == self._editState[name]:
+                continue
+
+            element = getattr(self, name)
+
+            if element is None or isinstance(element, Chapters) and len(element.editionEntries) == 0 \
+                    or isinstance(element, Attachments) and len(element.attachedFiles) == 0 \
+                    or isinstance(element, Tags) and len(element.tagList) == 0:
+                """Element was removed or emptied."""
+                for seek in list.copy(self.seekHead.seeks):
+                    if seek.seekID == cls.ebmlID:
+                        self.deleteChildElement(seek.seekPosition)
+
+            else:
+                self.rewriteChildElement(element)
+
+            self._editState[name] = self._elementState(name)
+
+        if self._modified:
+            self._rewriteSeekHead()
+
+    def _slotSize(self, offset):
+        """
+        Space available at 'offset': the element there and any Void elements following it, found by reading element
+        headers, so that clusters not discovered yet (lazy mode) are never overwritten. Bytes that do not parse as
+        an element header (e.g., space skipped when muxing) are free up to the next known child element.
+        """
+        nextOffset = min((o for o in self._knownChildren if o > offset), default=self._contentssize)
+        ebmlID, sizesize, dataSize, dataOffset = parseElementHeaderAt(self.readbytes(offset, 12))
+        end = offset + dataOffset + dataSize
+
+        while end < nextOffset:
+            try:
+                ebmlID, sizesize, dataSize, dataOffset = parseElementHeaderAt(self.readbytes(end, 12))
+
+            except (ValueError, IndexError):
+                return nextOffset - offset
+
+            if ebmlID != Void.ebmlID or dataSize is None:
+                break
+
+            end += dataOffset + dataSize
+
+        return min(end, nextOffset) - offset
+
+    def _writeVoid(self, offset, size):
+        """Writes a Void element header at 'offset', spanning 'size' bytes in total."""
+        if size - 2 < 127:
+            header = Void.ebmlID + bytes([0x80 | (size - 2)])
+
+        else:
+            header = Void.ebmlID + (2**56 | (size - 9)).to_bytes(8, "big")
+
+        self.seek(offset)
+        self._file.write(header)
+
+    def _writeInSlot(self, child, offset):
+        """
+        Writes 'child' at 'offset' in place of the element there, if it fits in its slot. Returns True if written.
+
+        The slot size is taken from self._slots (filled in by self._init_mux() and self._init_append()) if known, and
+        read back from the file otherwise.
+        """
+        slot = self._slots.get(offset)
+
+        if slot is None:
+            slot = self._slotSize(offset)
+        size = child.size()
+
+        if size != slot and size + 2 > slot:
+            return False
+
+        self.deleteChildElement(offset)
+        self.seek(offset)
+        self.writeChildElement(child)
+
+        if size < slot:
+            self._writeVoid(offset + size, slot - size)
+
+        return True
+
+    def rewriteChildElement(self, child):
+        """
+        Writes 'child' (Info, Tracks, Chapters, Attachments or Tags) in place of the existing element of the same
+        type, if it fits in the space the existing element and any Void following it occupy. Otherwise, the
+        existing element is voided and 'child' is written at the end of the segment. Clusters are never moved.
+
+        Updates self.seekHead, which must then be rewritten (self.close() does so).
+
+        Returns the offset 'child' was written at.
+        """
+
+        with self.lock:
+            if isinstance(child, Attachments):
+                """Attachment data may be read from the region about to be overwritten."""
+                for attachedFile in child.attachedFiles:
+                    if isinstance(attachedFile.fileData.data, FilePointer):
+                        attachedFile.fileData.data = b"".join(attachedFile.fileData)
+
+            for seek in self.seekHead.seeks:
+                if seek.seekID == child.ebmlID:
+                    offset = seek.seekPosition
+
+                    if self._writeInSlot(child, offset):
+                        return offset
+
+                    self.deleteChildElement(offset)
+                    break
+
+            return self._writeAtEnd(child)
+
+    def _writeAtEnd(self, child):
+        """Writes 'child' after the last element of the segment, growing the segment. Returns its offset."""
+        self.seek(self._contentssize)
+        offset = self.writeChildElement(child)
+        end = offset + child.size()
+
+        if self._contentssize < end:
+            """Makes sure the new Segment size is written by self.close()."""
+            self._contentssize = end
+            self._modified = True
+
+        return offset
+
+    def _rewriteSeekHead(self, moveTo=None):
+        """
+        Writes self.seekHead in place of the existing SeekHead, if it fits in its slot. Otherwise, it is written at
+        'moveTo' (default: the end of the segment), leaving a SeekHead pointing to it in its place.
+
+        Returns the offset just past the moved SeekHead, or None if it was written in place.
+        """
+        with self.lock:
+            offset = self._seekHeadOffset
+
+            if offset is not None and self._writeInSlot(self.seekHead, offset):
+                return
+
+            if moveTo is None:
+                newOffset = self._writeAtEnd(self.seekHead)
+
+            else:
+                self.seek(moveTo)
+                newOffset = self.writeChildElement(self.seekHead)
+
+                if self._contentssize < newOffset + self.seekHead.size():
+                    """Makes sure the new Segment size is written by self.close()."""
+                    self._contentssize = newOffset + self.seekHead.size()
+                    self._modified = True
+
+            if offset is not None:
+                pointer = SeekHead([Seek(seekID=SeekHead.ebmlID, seekPosition=newOffset)], parent=self)
+
+                if not self._writeInSlot(pointer, offset):
+                    raise ValueError("No room for SeekHead.")
+
+            return newOffset + self.seekHead.size()
+
+    def _clusterExtentAt(self, offset):
+        """
+        Checks whether a cluster starts at 'offset'. Returns a tuple (timestamp, dataOffset, dataSize), where
+        'dataSize' covers only the complete child elements (a capture may end in the middle of a block, and its
+        clusters may have unknown size), or None.
+        """
+        header = self.readbytes(offset, 12)
+
+        try:
+            ebmlID, sizesize, dataSize, dataOffset = parseElementHeaderAt(header)
+
+        except (ValueError, IndexError):
+            return
+
+        if ebmlID != Cluster.ebmlID:
+            return
+
+        dataOffset += offset
+        end = self._contentssize
+
+        if dataSize is not None:
+            if dataOffset + dataSize > end:
+                return
+
+            end = dataOffset + dataSize
+
+        data = self.readbytes(dataOffset, end - dataOffset)
+        segmentChildIDs = set(self.__ebmlpropertiesbyid__) | set(self._childTypes)
+        position = 0
+        timestamp = None
+
+        while position < len(data):
+            try:
+                childID, sizesize, childSize, childOffset = parseElementHeaderAt(data, position)
+
+            except (ValueError, IndexError):
+                break
+
+            if childSize is None or childOffset + childSize > len(data):
+                break
+
+            if timestamp is None:
+                if position == 0 and childID == CRC32.ebmlID:
+                    pass
+
+                elif childID != Timestamp.ebmlID:
+                    """Cluster ID found inside of block data."""
+                    return
+
+                else:
+                    timestamp = int.from_bytes(data[childOffset:childOffset + childSize], "big")
+
+            elif childID in segmentChildIDs:
+                """End of a cluster of unknown size."""
+                break
+
+            position = childOffset + childSize
+
+        if timestamp is None:
+            return
+
+        return (timestamp, dataOffset, position)
+
+    def recoverDuration(self, write=False, window=2**20, limit=64*2**20):
+        """
+        Finds the end timestamp of each track from the last cluster of the segment, without scanning the segment,
+        for files whose Info lacks Duration (e.g., live captures, which may also be truncated).
+
+        The last cluster is found by searching backwards from the end of the segment for a Cluster ID, 'window'
+        bytes at a time and over at most 'limit' bytes. Only its block headers are parsed.
+
+        'write': Also set self.info.duration to the largest end timestamp. It is written back by self.close() if the
+            file was opened with mode "r+".
+
+        Returns a dict mapping track numbers to end timestamps (in seconds), for the tracks that have blocks in the
+        last cluster, or None if no cluster was found.
+        """
+
+        end = self._contentssize
+        stop = max(end - limit, 0)
+        position = end
+        idsize = len(Cluster.ebmlID)
+        extent = None
+
+        while extent is None and position > stop:
+            start = max(position - window, stop)
+
+            """Overlaps the next window, in case a Cluster ID straddles the boundary."""
+            data = bytes(self.readbytes(start, position - start + idsize - 1))
+            k = len(data)
+
+            while extent is None:
+                k = data.rfind(Cluster.ebmlID, 0, k + idsize - 1)
+
+                if k < 0:
+                    break
+
+                extent = self._clusterExtentAt(start + k)
+
+            position = start
+
+        if extent is None:
+            return
+
+        timestamp, dataOffset, dataSize = extent
+        cluster = Cluster(timestamp, offsetInSegment=dataOffset, dataSize=dataSize, readonly=True, parent=self)
+        ends = {}
+
+        for (offset, ebmlID, sizesize, size, frames, trackNumber, pts, duration,
+                keyframe, invisible, discardable, referencePriority, referenceBlocks) in cluster.scanBlocks():
+            """'duration' covers all laced frames of the block."""
+            ends[trackNumber] = max(ends.get(trackNumber, 0), pts + duration)
+
+        if write and ends:
+            self.info.duration = max(ends.values())/self.info.timestampScale
+
+        return {trackNumber: float(pts/10**9) for trackNumber, pts in ends.items()}
+
     def close(self):
-        if self._file.writable():
+        if self._editMode:
+            self._commitEdits()
+
+        elif self._file.writable():
+            self.flushInterleaved()
+
             if self._currentCluster is not None:
                 self.writeCluster()
 
-            self.seek(max(self.tell(), 128))
+            if self._checkpointOffset is not None:
+                """Completes the checkpoint Cues instead of writing another copy."""
+                self.checkpoint()
+
+            end = max(self.tell(), 128)
+            infoWritten = True
+
+            if self._muxInitialized:
+                """Info may have changed since it was last written (e.g., Duration, NextUID)."""
+                with self.lock:
+                    infoWritten = self._writeInfo()
+
+            self.seek(end)
 
             if self.cues not in self.seekHead:
                 self.writeChildElement(self.cues)
@@ -503,15 +1576,31 @@ class Segment(EBMLBody):
                 self.makeStatsTags()
                 self.writeChildElement(self.tags)
 
+            if not infoWritten:
+                """Info outgrew its slot (e.g., appending to a file that had no Duration)."""
+                self.rewriteChildElement(self.info.copy())
+
             if self._modified:
-                if self._seekHeadOffset is not None:
-                    self.deleteChildElement(self._seekHeadOffset)
-                    self.seek(self._seekHeadOffset)
+                if self._seekHeadOffset is None and not self._muxInitialized:
+                    """Nothing was muxed, so the space reserved at the start of the segment is still free."""
+                    self.seek(0)
+                    self.writeChildElement(self.seekHead)
 
                 else:
-                    self.seek(0)
+                    self._rewriteSeekHead()
+
+        if self._mmap is not None:
+            self._map.release()
+            self._map = None
+
+            try:
+                self._mmap.close()
+
+            except BufferError:
+                """Packets still reference the map. It is unmapped once they are garbage collected."""
+                pass
 
-                self.writeChildElement(self.seekHead)
+            self._mmap = None
 
         super().close()
 
@@ -521,13 +1610,14 @@ class Segment(EBMLBody):
 
     @property
     def clusterCount(self):
+        self._ensureScanned()
         return len(self._clustersByOffset)
 
     @property
     def firstClusterOffset(self):
+        self._ensureScanned()
         return min(self._clustersByOffset.keys())
 
     @property
     def lastClusterEnd(self):
         return self._lastClusterEnd
-
@@ -0,0 +1,428 @@
+from ebml.head import EBMLHead
+
+from .segment import Segment
+from .seekhead import SeekHead
+from .info import Info
+from .tracks import Tracks
+from .chapters import Chapters
+from .attachments import Attachments
+from .cluster import Cluster, Timestamp, demuxBlockData
+from .cues import Cues, CueTrackPositions, CuePoint
+from .tags import Tags
+from .blocks import SimpleBlock, BlockGroup
+from .util import parseElementHeaderAt
+
+import io
+
+__all__ = ["MatroskaStreamWriter", "MatroskaStreamParser", "LiveSegment"]
+
+class _CountingWriter(object):
+    """
+    Wraps a write-only, possibly non-seekable file object, keeping track of the number of bytes written so that
+    tell() works on pipes and sockets. Seeking is only allowed to the current position.
+    """
+
+    def __init__(self, file):
+        self._file = file
+        self._written = 0
+
+    def write(self, data):
+        n = self._file.write(data)
+
+        if n is None:
+            n = len(data)
+
+        self._written += n
+        return n
+
+    def tell(self):
+        return self._written
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self._written
+
+        elif whence == 2:
+            raise io.UnsupportedOperation("Cannot seek relative to end of stream.")
+
+        if offset != self._written:
+            raise io.UnsupportedOperation("Cannot seek in a live stream.")
+
+        return self._written
+
+    def flush(self):
+        self._file.flush()
+
+    def readable(self):
+        return False
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def close(self):
+        self._file.close()
+
+class LiveSegment(Segment):
+    """
+    Segment written strictly sequentially: the Segment has unknown size, Info and Tracks are written before the
+    first cluster, and each cluster is written in one piece once it is complete. Nothing is ever rewritten, so the
+    output does not need to be seekable.
+
+    'clusterDuration' (in nanoseconds): Start a new cluster once the current one spans this long, bounding latency
+        for streams without video keyframes. None disables this.
+    'writeCues', 'writeTags': Index keyframes and write Cues, and write statistics Tags, after the last cluster in
+        self.close().
+    """
+
+    clusterDuration = 10**9
+    writeCues = False
+    writeTags = False
+
+    def _init_write(self):
+        self._init_children()
+        self._file.write(self.ebmlID + b"\x01\xff\xff\xff\xff\xff\xff\xff")
+        self._dataStart = self._file.tell()
+
+    def tell(self):
+        return self._file.tell() - self._dataStart
+
+    def seek(self, offset, whence=0):
+        if whence == 0:
+            offset += self._dataStart
+
+        return self._file.seek(offset, whence) - self._dataStart
+
+    def _init_mux(self):
+        self._muxInitialized = True
+        self._file.write(self.info.toBytes())
+        self._infoDuration = self.info.duration
+        self._file.write(self.tracks.toBytes())
+
+        if len(self.chapters.editionEntries):
+            self._file.write(self.chapters.toBytes())
+
+        if len(self.attachments.attachedFiles):
+            self._file.write(self.attachments.toBytes())
+
+        self._trackPackets = {track.trackNumber: 0 for track in self.tracks.trackEntries}
+        self._trackBytes = {track.trackNumber: 0 for track in self.tracks.trackEntries}
+        self._trackDurations = {track.trackNumber: 0 for track in self.tracks.trackEntries}
+
+    def _mux(self, packet, newcluster=False, cuepoint=False):
+        cluster = self._currentCluster
+
+        if (self.clusterDuration is not None and cluster is not None and packet.pts is not None
+                and packet.pts - cluster.timestamp*self.info.timestampScale >= self.clusterDuration):
+            newcluster = True
+
+        return super(LiveSegment, self)._mux(packet, newcluster, cuepoint)
+
+    def writeCluster(self):
+        clusterOffset = self.tell()
+
+        if self.writeCues:
+            inClusterOffset = 0
+
+            for item in self._currentCluster.iterchildren():
+                if item in self._blocksToIndex:
+                    cueTrackPositions = CueTrackPositions(cueClusterPosition=clusterOffset,
+                                                          cueRelativePosition=inClusterOffset, cueTrack=item.trackNumber)
+
+                    cuePoint = CuePoint(cueTime=item.pts, cueTrackPositionsList=[cueTrackPositions])
+                    self.cues.cuePoints.append(cuePoint)
+
+                inClusterOffset += item.size()
+
+            self._cueIndex = None
+
+        with self.lock:
+            self._file.write(self._currentCluster.toBytes())
+            self._lastClusterEnd = self.tell()
+
+            if self.syncClusters:
+                self._file.flush()
+
+        self._currentCluster = None
+        self._currentBlocks.clear()
+        self._blocksToIndex.clear()
+
+    def close(self):
+        self.flushInterleaved()
+
+        if self._currentCluster is not None:
+            self.writeCluster()
+
+        if self.writeCues and len(self.cues.cuePoints):
+            self._file.write(self.cues.toBytes())
+
+        if self.writeTags and self._packetsMuxed:
+            self.makeStatsTags()
+            self._file.write(self.tags.toBytes())
+
+        self._file.flush()
+
+class MatroskaStreamWriter(object):
+    def __init__(self, file, cues=False, tags=False):
+        """
+        Writes a Matroska stream to a write-only, possibly non-seekable output (e.g., sys.stdout.buffer, a pipe or
+        a socket file), for live streaming.
+
+        The EBML header is written immediately. Info and Tracks are written with the first packet, so set up
+        tracks before calling mux(). Clusters are written as soon as they are complete.
+
+        'file': A file name or a binary file object opened for writing.
+        'cues': Index keyframes and write Cues after the last cluster in close().
+        'tags': Write statistics Tags after the last cluster in close().
+        """
+
+        if isinstance(file, str):
+            file = open(file, "wb")
+            self._closefile = True
+
+        else:
+            self._closefile = False
+
+        self._file = _CountingWriter(file)
+
+        head = EBMLHead(docType="matroska", docTypeReadVersion=2, docTypeVersion=4,
+                                  ebmlMaxIDLength=4, ebmlMaxSizeLength=8, ebmlReadVersion=1, ebmlVersion=1)
+
+        self._file.write(head.toBytes())
+        self.body = LiveSegment(self._file)
+        self.body.writeCues = cues
+        self.body.writeTags = tags
+
+    def close(self):
+        """
+        Writes any pending cluster, as well as the optional Cues and Tags trailers.
+        """
+        self.body.close()
+
+        if self._closefile:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def writingApp(self):
+        return self.body.info.writingApp
+
+    @writingApp.setter
+    def writingApp(self, value):
+        self.body.info.writingApp = value
+
+    @property
+    def title(self):
+        return self.body.info.title
+
+    @title.setter
+    def title(self, value):
+        self.body.info.title = value
+
+    @property
+    def mux(self):
+        """
+        Shortcut to LiveSegment.mux().
+
+        See help(matroska.segment.Segment.mux).
+        """
+        return self.segment.mux
+
+    @property
+    def segment(self):
+        return self.body
+
+    @property
+    def tracks(self):
+        return self.segment.tracks
+
+    @property
+    def tags(self):
+        return self.segment.tags
+
+    @property
+    def attachments(self):
+        return self.segment.attachments
+
+    @property
+    def chapters(self):
+        return self.segment.chapters
+
+class MatroskaStreamParser(object):
+    """
+    Push-based demuxer for Matroska streams read from non-seekable inputs (pipes, sockets).
+
+    Bytes are passed to self.feed() as they arrive, in chunks of any size, and packets are returned as soon as the
+    block containing them is complete. Only the element being parsed is buffered (at most one block, or the Info or
+    Tracks element), and elements the parser has no use for are skipped without being buffered. Segments and
+    clusters of unknown size are supported.
+
+    Once Info and Tracks have been read, they are available as self.info and self.tracks.
+    """
+
+    _topLevelIDs = {EBMLHead.ebmlID, Segment.ebmlID}
+    _segmentChildIDs = {SeekHead.ebmlID, Info.ebmlID, Tracks.ebmlID, Chapters.ebmlID, Attachments.ebmlID,
+                        Cluster.ebmlID, Cues.ebmlID, Tags.ebmlID}
+
+    def __init__(self, trackNumber=None):
+        """
+        'trackNumber': Only return packets from this track number (or tuple/list/set of track numbers).
+        """
+        self.trackNumber = trackNumber
+        self.head = None
+        self.info = None
+        self.tracks = None
+        self._buffer = bytearray()
+        self._position = 0
+        self._skip = 0
+        self._parents = []
+        self._trackInfo = None
+        self._clusterTimestamp = None
+
+    @staticmethod
+    def _headerLength(data, offset):
+        """Returns the length of the element header at data[offset], or None if it is not complete yet."""
+        if offset >= len(data):
+            return
+
+        first = data[offset]
+
+        if first == 0:
+            raise ValueError(f"Invalid element ID at stream offset {offset}.")
+
+        idsize = 9 - first.bit_length()
+
+        if offset + idsize >= len(data):
+            return
+
+        first = data[offset + idsize]
+
+        if first == 0:
+            raise ValueError(f"Invalid element size at stream offset {offset}.")
+
+        length = idsize + 9 - first.bit_length()
+
+        if offset + length > len(data):
+            return
+
+        return length
+
+    def _level(self, ebmlID):
+        if ebmlID in self._topLevelIDs:
+            return 0
+
+        if ebmlID in self._segmentChildIDs:
+            return 1
+
+    def feed(self, data):
+        """
+        Parses the next chunk of the stream.
+
+        Returns a list of the packets completed by this chunk.
+        """
+        buffer = self._buffer
+        buffer += data
+        packets = []
+        offset = 0
+
+        try:
+            while True:
+                if self._skip:
+                    n = min(self._skip, len(buffer) - offset)
+                    offset += n
+                    self._skip -= n
+
+                    if self._skip:
+                        break
+
+                position = self._position + offset
+
+                while self._parents and self._parents[-1][1] is not None and position >= self._parents[-1][1]:
+                    self._parents.pop()
+
+                headerLength = self._headerLength(buffer, offset)
+
+                if headerLength is None:
+                    break
+
+                ebmlID, sizesize, dataSize, dataOffset = parseElementHeaderAt(buffer, offset)
+                level = self._level(ebmlID)
+
+                """An element of unknown size ends where an element that cannot be its child begins."""
+                while self._parents and self._parents[-1][1] is None and level is not None \
+                        and level < len(self._parents):
+                    self._parents.pop()
+
+                depth = len(self._parents)
+                parentID = self._parents[-1][0] if self._parents else None
+
+                if ebmlID == Segment.ebmlID and depth == 0 or ebmlID == Cluster.ebmlID and parentID == Segment.ebmlID:
+                    """Descend into master element."""
+                    end = position + headerLength + dataSize if dataSize is not None else None
+                    self._parents.append((ebmlID, end))
+                    offset += headerLength
+
+                    if ebmlID == Cluster.ebmlID:
+                        self._clusterTimestamp = None
+
+                    continue
+
+                wanted = (depth == 0 and ebmlID == EBMLHead.ebmlID
+                          or parentID == Segment.ebmlID and ebmlID in (Info.ebmlID, Tracks.ebmlID)
+                          or parentID == Cluster.ebmlID and ebmlID in (Timestamp.ebmlID, SimpleBlock.ebmlID,
+                                                                       BlockGroup.ebmlID))
+
+                if dataSize is None:
+                    raise ValueError(f"Unexpected element of unknown size at stream offset {position}.")
+
+                if not wanted:
+                    offset += headerLength
+                    self._skip = dataSize
+                    continue
+
+                if len(buffer) - offset < headerLength + dataSize:
+                    break
+
+                """Copied, so that no view into the buffer outlives this iteration."""
+                element = memoryview(buffer[offset:offset + headerLength + dataSize])
+                self._handleElement(ebmlID, element, headerLength, packets)
+                offset += headerLength + dataSize
+
+        finally:
+            del buffer[:offset]
+            self._position += offset
+
+        return list(Segment._packetsFromTuples(packets))
+
+    def _handleElement(self, ebmlID, element, headerLength, packets):
+        if ebmlID == EBMLHead.ebmlID:
+            self.head = EBMLHead.fromBytes(bytes(element))
+
+            if self.head.docType not in ("matroska", "webm"):
+                raise ValueError("Not a matroska stream.")
+
+        elif ebmlID == Info.ebmlID:
+            self.info = Info.fromBytes(bytes(element))
+
+        elif ebmlID == Tracks.ebmlID:
+            self.tracks = Tracks.fromBytes(bytes(element))
+            self._trackInfo = {track.trackNumber: (track.defaultDuration, track.compression)
+                               for track in self.tracks.trackEntries}
+
+        elif ebmlID == Timestamp.ebmlID:
+            self._clusterTimestamp = int.from_bytes(element[headerLength:], "big")
+
+        else:
+            if self._trackInfo is None or self._clusterTimestamp is None:
+                raise ValueError("Block encountered before Tracks or cluster Timestamp.")
+
+            timestampScale = self.info.timestampScale if self.info is not None else 10**6
+            demuxBlockData(ebmlID, element[headerLength:], self._clusterTimestamp, timestampScale,
+                           self._trackInfo, packets, trackNumber=self.trackNumber)
@@ -442,8 +442,9 @@ class TrackTranslates(EBMLList):
 
 class TrackEntry(EBMLMasterElement):
     ebmlID = b"\xae"
+    trackNumber = EBMLProperty("trackNumber", TrackNumber)
     __ebmlchildren__ = (
-            EBMLProperty("trackNumber", TrackNumber),
+            trackNumber,
             EBMLProperty("trackUID", TrackUID),
             EBMLProperty("trackType", TrackType),
             EBMLProperty("flagEnabled", FlagEnabled, True),
@@ -473,6 +474,19 @@ class TrackEntry(EBMLMasterElement):
         )
     __ebmladdproperties__ = (EBMLProperty("maxInLace", int, optional=True),)
 
+    @trackNumber.sethook
+    def trackNumber(self, value):
+        """Renumbering a track invalidates the Tracks.byTrackNumber lookup table."""
+        tracks = getattr(self, "parent", None)
+
+        if isinstance(tracks, TrackEntries):
+            tracks = getattr(tracks, "parent", None)
+
+        if isinstance(tracks, Tracks):
+            tracks._byTrackNumber = None
+
+        return value
+
     @property
     def compression(self):
         if self.contentEncodings is None:
@@ -517,25 +531,30 @@ class Tracks(EBMLMasterElement):
     trackEntries = EBMLProperty("trackEntries", TrackEntries)
     __ebmlchildren__ = (trackEntries,)
 
+    @trackEntries.sethook
+    def trackEntries(self, value):
+        self._byTrackNumber = None
+        return value
+
     @property
     def __len__(self):
         return self.trackEntries.__len__
 
-    @property
-    def append(self):
-        return self.trackEntries.append
+    def append(self, track):
+        self.trackEntries.append(track)
+        self._byTrackNumber = None
 
-    @property
-    def insert(self):
-        return self.trackEntries.insert
+    def insert(self, index, track):
+        self.trackEntries.insert(index, track)
+        self._byTrackNumber = None
 
-    @property
-    def remove(self):
-        return self.trackEntries.remove
+    def remove(self, track):
+        self.trackEntries.remove(track)
+        self._byTrackNumber = None
 
-    @property
-    def extend(self):
-        return self.trackEntries.extend
+    def extend(self, tracks):
+        self.trackEntries.extend(tracks)
+        self._byTrackNumber = None
 
     @property
     def __iter__(self):
@@ -547,7 +566,16 @@ class Tracks(EBMLMasterElement):
 
     @property
     def byTrackNumber(self):
-        return {track.trackNumber: track for track in self.trackEntries}
+        """
+        Mapping of track numbers to TrackEntry objects. Maintained between calls and rebuilt only after tracks are
+        added, removed or renumbered. Do not modify the returned dict.
+        """
+        byTrackNumber = getattr(self, "_byTrackNumber", None)
+
+        if byTrackNumber is None or len(byTrackNumber) != len(self.trackEntries):
+            byTrackNumber = self._byTrackNumber = {track.trackNumber: track for track in self.trackEntries}
+
+        return byTrackNumber
 
     @property
     def video(self):
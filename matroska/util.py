@@ -0,0 +1,76 @@
+"""
+Offset-based EBML parsing helpers.
+
+These work on bytes, bytearray, memoryview and mmap objects alike, and never slice the input, so parsing a buffer
+does not copy it.
+"""
+
+__all__ = ["parseVintAt", "parseElementHeaderAt", "iterElements", "unknownSize"]
+
+def unknownSize(length):
+    """Value of an all-ones (unknown) size vint of 'length' bytes."""
+    return 2**(7*length) - 1
+
+def parseVintAt(data, offset=0):
+    """
+    Reads a variable-length integer starting at data[offset].
+
+    Returns a tuple (value, length), with the length marker removed from value.
+    """
+    first = data[offset]
+
+    if first == 0:
+        raise ValueError(f"Invalid variable-length integer at offset {offset}.")
+
+    length = 9 - first.bit_length()
+    value = first & (0xff >> length)
+
+    for k in range(offset + 1, offset + length):
+        value = value << 8 | data[k]
+
+    return (value, length)
+
+def parseElementHeaderAt(data, offset=0):
+    """
+    Reads an element header starting at data[offset].
+
+    Returns a tuple (ebmlID, sizesize, dataSize, dataOffset). 'dataSize' is None if the element has unknown size.
+    """
+    first = data[offset]
+
+    if first == 0:
+        raise ValueError(f"Invalid element ID at offset {offset}.")
+
+    idsize = 9 - first.bit_length()
+    ebmlID = bytes(data[offset:offset + idsize])
+    dataSize, sizesize = parseVintAt(data, offset + idsize)
+
+    if dataSize == unknownSize(sizesize):
+        dataSize = None
+
+    return (ebmlID, sizesize, dataSize, offset + idsize + sizesize)
+
+def iterElements(data, start=0, end=None):
+    """
+    Iterates over consecutive elements in data[start:end].
+
+    Yields tuples (offset, ebmlID, sizesize, dataStart, dataEnd), where 'offset' is relative to 'start'.
+    """
+    if end is None:
+        end = len(data)
+
+    offset = start
+
+    while offset < end:
+        ebmlID, sizesize, dataSize, dataStart = parseElementHeaderAt(data, offset)
+
+        if dataSize is None:
+            raise ValueError(f"Unexpected element of unknown size at offset {offset - start}.")
+
+        dataEnd = dataStart + dataSize
+
+        if dataEnd > end:
+            raise ValueError(f"Element at offset {offset - start} extends past end of data.")
+
+        yield (offset - start, ebmlID, sizesize, dataStart, dataEnd)
+        offset = dataEnd
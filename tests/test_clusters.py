@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip("ebml")
+
+from matroska import MatroskaFile
+from matroska.blocks import Packet
+from matroska.cluster import Cluster
+from matroska.util import parseElementHeaderAt
+
+def test_cluster_offsets_after_void_and_cues(tmp_path):
+    """A Void (header padding) precedes the first cluster, and checkpoint Cues precede later ones."""
+    path = str(tmp_path/"offsets.mkv")
+
+    f = MatroskaFile(path, "w")
+    f.segment.headerPadding = 4096
+    f.segment.checkpointClusters = 1
+    track = f.tracks.new("V_MPEG4/ISO/AVC", pixelWidth=64, pixelHeight=64)
+
+    for k in range(4):
+        f.mux(Packet(track.trackNumber, data=bytes([k])*64, pts=k*10**9, keyframe=True), newcluster=True)
+
+    f.close()
+
+    f = MatroskaFile(path, "r", lazy=True)
+
+    try:
+        segment = f.segment
+        clusters = list(segment.iterClusters())
+        assert len(clusters) == 4
+
+        for cluster in clusters:
+            ebmlID, sizesize, dataSize, dataOffset = parseElementHeaderAt(segment.readbytes(cluster.offsetInParent, 12))
+            assert ebmlID == Cluster.ebmlID
+            assert cluster.offsetInParent + dataOffset == cluster.offsetInSegment
+
+        cuePositions = {cueTrackPositions.cueClusterPosition for cuePoint in segment.cues.cuePoints
+                        for cueTrackPositions in cuePoint.cueTrackPositionsList}
+        assert cuePositions == {cluster.offsetInParent for cluster in clusters}
+
+    finally:
+        f.close()
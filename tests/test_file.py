@@ -0,0 +1,26 @@
+import pytest
+
+pytest.importorskip("ebml")
+
+from matroska import MatroskaFile
+from matroska.blocks import Packet
+
+@pytest.mark.parametrize("mode", ["w", "a", "r+"])
+def test_mmap_requires_read_mode(tmp_path, mode):
+    path = str(tmp_path/"mmap.mkv")
+
+    f = MatroskaFile(path, "w")
+    track = f.tracks.new("V_MPEG4/ISO/AVC", pixelWidth=64, pixelHeight=64)
+    f.mux(Packet(track.trackNumber, data=bytes(64), pts=0, keyframe=True))
+    f.close()
+
+    with pytest.raises(ValueError):
+        MatroskaFile(path, mode, mmap=True)
+
+    f = MatroskaFile(path, "r", mmap=True)
+
+    try:
+        assert len(list(f.demux())) == 1
+
+    finally:
+        f.close()
@@ -0,0 +1,44 @@
+import pytest
+
+pytest.importorskip("ebml")
+
+from matroska import MatroskaFile
+from matroska.blocks import Packet
+
+ms = 10**6
+
+def test_interleave_keeps_track_order(tmp_path):
+    """B-frame video: pts is not monotonic within the video track, and must come out in the order it was muxed."""
+    path = str(tmp_path/"interleave.mkv")
+    videoPts = [0, 120, 40, 80, 240, 160, 200, 360, 280, 320]
+    audioPts = list(range(0, 400, 20))
+
+    f = MatroskaFile(path, "w", interleave=True)
+    video = f.tracks.new("V_MPEG4/ISO/AVC", pixelWidth=64, pixelHeight=64)
+    audio = f.tracks.new("A_PCM/INT/LIT", samplingFrequency=48000.0, channels=2)
+
+    videoPackets = [Packet(video.trackNumber, data=bytes([k])*16, pts=pts*ms, keyframe=(k == 0))
+                    for k, pts in enumerate(videoPts)]
+    audioPackets = [Packet(audio.trackNumber, data=bytes([k])*8, pts=pts*ms, keyframe=True)
+                    for k, pts in enumerate(audioPts)]
+
+    """Submit all video first, so that reordering across tracks is also exercised."""
+    for packet in videoPackets + audioPackets:
+        f.mux(packet)
+
+    f.close()
+
+    f = MatroskaFile(path, "r")
+
+    try:
+        packets = list(f.demux())
+
+    finally:
+        f.close()
+
+    assert [packet.pts//ms for packet in packets if packet.trackNumber == video.trackNumber] == videoPts
+    assert [packet.pts//ms for packet in packets if packet.trackNumber == audio.trackNumber] == audioPts
+
+    """Across tracks, audio is no longer written after all of the video."""
+    trackNumbers = [packet.trackNumber for packet in packets]
+    assert trackNumbers.index(audio.trackNumber) < len(videoPts)